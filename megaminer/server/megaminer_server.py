@@ -19,11 +19,23 @@ import os
 import sys
 import time
 import hashlib
+import hmac
 import secrets
 import uuid
 import signal
 import argparse
+import cProfile
+import io
+import logging
+import pstats
 import math
+import heapq
+import struct
+import sqlite3
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 
 try:
@@ -32,6 +44,11 @@ except ImportError:
     print("ERROR: websockets library not found. Install with: pip install websockets")
     sys.exit(1)
 
+try:
+    import numpy as np
+except ImportError:
+    np = None  # Optional - enables vectorized terrain generation
+
 # ============================================================================
 # CONFIGURATION
 # ============================================================================
@@ -68,6 +85,12 @@ DEFAULT_CONFIG = {
         "min_username_length": 3,
         "max_username_length": 16,
         "min_password_length": 4,
+        "password_kdf": "pbkdf2_sha256",  # "pbkdf2_sha256" or "scrypt"; older hashes upgrade on login
+        "pbkdf2_iterations": 200000,
+        "scrypt_n": 16384,  # scrypt CPU/memory cost (r=8, p=1)
+        "session_ttl": 7 * 24 * 3600,  # Seconds a session token stays valid after its last use
+        "max_sessions_per_user": 5,  # Older tokens of a user are revoked past this many
+        "server_admins": [],  # Logged-in accounts allowed server-wide admin actions (profiling); empty = none
         "users": {
             # Example - pre-defined users that bypass registration:
             # "admin": "secure_password"
@@ -77,6 +100,28 @@ DEFAULT_CONFIG = {
         "data_directory": "server_data",
         "worlds_directory": "server_data/worlds",
         "accounts_file": "server_data/accounts.json"
+    },
+    "performance": {
+        "chunk_cache_mb": 32,  # Memory budget for materialized terrain chunks
+        "save_max_delay": 5,  # Max seconds a change may stay unsaved (data-loss window)
+        "journal_enabled": True,  # Append tile changes to a write-ahead journal
+        "journal_max_bytes": 4 * 1024 * 1024,  # Compact into a snapshot past this size
+        "journal_max_age": 300,  # ...or this many seconds after the last snapshot
+        "journal_fsync_interval": 1,  # Seconds between fsyncs of the journal (what a power loss can lose)
+        "broadcast_tick_hz": 20,  # Rate at which moves and batched updates are flushed
+        "interest_radius": 64,  # Tiles around a player within which they receive local updates
+        "max_subscribe_radius": 6,  # Largest chunk radius a streaming client may subscribe to
+        "sim_tick_hz": 10,  # Fixed simulation rate of each room (falling blocks, events)
+        "max_catchup_ticks": 3,  # Ticks run back-to-back after a stall; older ones are skipped
+        "send_queue_limit": 256,  # Frames queued per connection before moves are dropped
+        "slow_client_timeout": 10,  # Seconds a client may stay over the limit before it is disconnected
+        "hash_workers": 2,  # Threads hashing passwords (logins/registrations in parallel)
+        "max_pending_auth": 64,  # Logins/registrations allowed to wait for a worker before "busy"
+        "session_flush_interval": 30,  # Seconds between batched writes of session changes
+        "metrics_host": "127.0.0.1",  # Prometheus-style /metrics endpoint (plain HTTP)
+        "metrics_port": 4243,  # 0 disables the endpoint
+        "profile_seconds": 30,  # Default length of an on-demand profile (SIGUSR1 / admin "profile")
+        "slow_callback_ms": 100  # Event-loop callbacks slower than this are captured while profiling
     }
 }
 
@@ -111,18 +156,204 @@ def load_config(config_path="server_config.json"):
 # DATA STORAGE
 # ============================================================================
 
+class SessionStore:
+    """Session tokens with sliding TTL expiry and a per-user cap.
+
+    Sessions are indexed in memory in least-recently-used order, globally
+    and per user, so expiry pops from the front and a user over
+    max_per_user loses their oldest token. Changes are only recorded in a
+    pending set; flush() writes them to the sessions table in one
+    transaction and is called on a timer rather than on every login.
+    """
+
+    def __init__(self, db, ttl, max_per_user):
+        self.db = db
+        self.ttl = ttl
+        self.max_per_user = max(1, max_per_user)
+        self.sessions = OrderedDict()  # token -> [username, created_at, last_used], LRU order
+        self.by_user = {}  # username -> OrderedDict(token -> None), LRU order
+        self.pending = {}  # token -> True (upsert) / False (delete), written by flush()
+        self.stats = {"created": 0, "expired": 0, "evicted": 0, "revoked": 0, "flushes": 0, "last_flush_rows": 0}
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def load(self):
+        """Load unexpired sessions from the database, dropping the rest."""
+        cutoff = time.time() - self.ttl
+        rows = self.db.execute(
+            "SELECT token, username, created_at, COALESCE(last_used, created_at, 0) AS used FROM sessions"
+            " WHERE used >= ? ORDER BY used", (cutoff,)).fetchall()
+        for token, username, created_at, last_used in rows:
+            self._insert(token, username, created_at or last_used, last_used)
+        self.db.execute("DELETE FROM sessions WHERE COALESCE(last_used, created_at, 0) < ?", (cutoff,))
+        return len(self.sessions)
+
+    def _insert(self, token, username, created_at, last_used):
+        self.sessions[token] = [username, created_at, last_used]
+        tokens = self.by_user.setdefault(username, OrderedDict())
+        tokens[token] = None
+        while len(tokens) > self.max_per_user:
+            oldest = next(iter(tokens))
+            self._remove(oldest)
+            self.stats["evicted"] += 1
+
+    def _remove(self, token):
+        entry = self.sessions.pop(token, None)
+        if entry is None:
+            return False
+        tokens = self.by_user.get(entry[0])
+        if tokens is not None:
+            tokens.pop(token, None)
+            if not tokens:
+                del self.by_user[entry[0]]
+        self.pending[token] = False
+        return True
+
+    def create(self, username):
+        """Start a new session for username and return its token."""
+        self.expire()
+        token = secrets.token_hex(32)
+        now = time.time()
+        self._insert(token, username, now, now)
+        self.pending[token] = True
+        self.stats["created"] += 1
+        return token
+
+    def validate(self, token):
+        """Return the session's username (refreshing its TTL), or None."""
+        entry = self.sessions.get(token)
+        if entry is None:
+            return None
+        now = time.time()
+        if now - entry[2] > self.ttl:
+            self._remove(token)
+            self.stats["expired"] += 1
+            return None
+        entry[2] = now
+        self.sessions.move_to_end(token)
+        self.by_user[entry[0]].move_to_end(token)
+        self.pending[token] = True
+        return entry[0]
+
+    def revoke(self, token):
+        if self._remove(token):
+            self.stats["revoked"] += 1
+
+    def revoke_user(self, username):
+        """Revoke every session of a user (e.g. when banned)."""
+        for token in list(self.by_user.get(username, ())):
+            self.revoke(token)
+
+    def expire(self, now=None):
+        """Drop sessions unused for longer than the TTL. Returns how many."""
+        cutoff = (now or time.time()) - self.ttl
+        expired = 0
+        sessions = self.sessions
+        while sessions:
+            token, entry = next(iter(sessions.items()))
+            if entry[2] >= cutoff:
+                break
+            self._remove(token)
+            expired += 1
+        self.stats["expired"] += expired
+        return expired
+
+    def flush(self):
+        """Write pending session changes in one transaction. Returns rows written."""
+        self.expire()
+        if not self.pending:
+            return 0
+        pending, self.pending = self.pending, {}
+        upserts = [(token, *self.sessions[token]) for token, live in pending.items()
+                   if live and token in self.sessions]
+        deletes = [(token,) for token, live in pending.items() if not live]
+        try:
+            self.db.execute("BEGIN")
+            self.db.executemany("INSERT OR REPLACE INTO sessions (token, username, created_at, last_used)"
+                                " VALUES (?, ?, ?, ?)", upserts)
+            self.db.executemany("DELETE FROM sessions WHERE token = ?", deletes)
+            self.db.execute("COMMIT")
+        except sqlite3.Error as e:
+            if self.db.in_transaction:
+                self.db.execute("ROLLBACK")
+            for token, live in pending.items():
+                self.pending.setdefault(token, live)
+            print(f"Error saving sessions: {e}")
+            return 0
+        self.stats["flushes"] += 1
+        self.stats["last_flush_rows"] = len(upserts) + len(deletes)
+        return self.stats["last_flush_rows"]
+
+
 class AccountManager:
-    """Handles user accounts with hashed passwords."""
+    """Handles user accounts with hashed passwords.
+
+    Accounts and sessions live in a SQLite database next to the configured
+    accounts file (accounts.json -> accounts.db), so a login or registration
+    touches single rows instead of rewriting every account. Usernames are
+    unique case-insensitively through an index. Existing accounts.json /
+    accounts_sessions.json files are imported once and renamed to
+    *.migrated.
+
+    Passwords are hashed with a slow KDF (PBKDF2 or scrypt). The server uses
+    register_async/login_async, which run the KDF on a small thread pool
+    with a bounded wait queue so a burst of logins cannot stall the game.
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS accounts (
+            username TEXT PRIMARY KEY,
+            password_hash TEXT NOT NULL,
+            salt TEXT NOT NULL,
+            created_at REAL,
+            last_login REAL,
+            banned INTEGER NOT NULL DEFAULT 0,
+            is_manual INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS accounts_username_nocase
+            ON accounts (username COLLATE NOCASE);
+        CREATE TABLE IF NOT EXISTS sessions (
+            token TEXT PRIMARY KEY,
+            username TEXT NOT NULL,
+            created_at REAL,
+            last_used REAL
+        );
+    """
 
     def __init__(self, accounts_path, config):
         self.accounts_path = accounts_path
         self.config = config
-        self.accounts = {}  # username -> { password_hash, salt, created_at, last_login, banned }
-        self.sessions = {}  # token -> username
+        accounts_cfg = config.get('accounts', {})
+        defaults = DEFAULT_CONFIG['accounts']
+        self.kdf = accounts_cfg.get('password_kdf', defaults['password_kdf'])
+        self.pbkdf2_iterations = accounts_cfg.get('pbkdf2_iterations', defaults['pbkdf2_iterations'])
+        self.scrypt_n = accounts_cfg.get('scrypt_n', defaults['scrypt_n'])
+        perf = config.get('performance', {})
+        workers = max(1, perf.get('hash_workers', DEFAULT_CONFIG['performance']['hash_workers']))
+        self.max_pending_auth = perf.get('max_pending_auth', DEFAULT_CONFIG['performance']['max_pending_auth'])
+        self.hash_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="kdf")
+        self._hash_slots = asyncio.Semaphore(workers)
+        self.auth_stats = {"logins": 0, "failed_logins": 0, "registrations": 0, "busy_rejects": 0,
+                           "upgraded_hashes": 0, "pending": 0}
+        self.login_times = deque(maxlen=1024)  # Recent login durations (s), including queueing
+        self._reported_logins = 0
         self.sessions_path = accounts_path.replace('.json', '_sessions.json')
+        root, ext = os.path.splitext(accounts_path)
+        self.db_path = root + '.db' if ext != '.db' else accounts_path
         self._ensure_directory()
-        self._load()
-        self._load_sessions()
+        self.db = sqlite3.connect(self.db_path, isolation_level=None)  # Autocommit; explicit BEGIN for batches
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(self._SCHEMA)
+        if "last_used" not in [row[1] for row in self.db.execute("PRAGMA table_info(sessions)")]:
+            self.db.execute("ALTER TABLE sessions ADD COLUMN last_used REAL")
+        self._migrate_json()
+        print(f"Loaded {self.get_account_count()} accounts from {self.db_path}")
+        self.sessions = SessionStore(self.db,
+                                     accounts_cfg.get('session_ttl', defaults['session_ttl']),
+                                     accounts_cfg.get('max_sessions_per_user', defaults['max_sessions_per_user']))
+        print(f"Loaded {self.sessions.load()} sessions")
         self._load_manual_users()
 
     def _ensure_directory(self):
@@ -130,42 +361,52 @@ class AccountManager:
         if directory and not os.path.exists(directory):
             os.makedirs(directory, exist_ok=True)
 
-    def _load(self):
-        if os.path.exists(self.accounts_path):
+    def _migrate_json(self):
+        """Import accounts.json and the sessions file left by older versions."""
+        for path, importer in ((self.accounts_path, self._import_accounts),
+                               (self.sessions_path, self._import_sessions)):
+            if path == self.db_path or not os.path.exists(path):
+                continue
             try:
-                with open(self.accounts_path, 'r') as f:
-                    self.accounts = json.load(f)
-                print(f"Loaded {len(self.accounts)} accounts from {self.accounts_path}")
+                with open(path, 'r') as f:
+                    data = json.load(f)
+                self.db.execute("BEGIN")
+                try:
+                    imported = importer(data)
+                    self.db.execute("COMMIT")
+                except Exception:
+                    self.db.execute("ROLLBACK")
+                    raise
+                os.replace(path, path + '.migrated')
+                print(f"[Accounts] Migrated {imported} entries from {path} to {self.db_path}")
             except Exception as e:
-                print(f"Warning: Could not load accounts: {e}")
-
-    def _save(self):
-        try:
-            self._ensure_directory()
-            with open(self.accounts_path, 'w') as f:
-                json.dump(self.accounts, f, indent=2)
-        except Exception as e:
-            print(f"Error saving accounts: {e}")
+                print(f"Warning: Could not migrate {path}: {e}")
+
+    def _import_accounts(self, accounts):
+        imported = 0
+        for username, account in accounts.items():
+            cur = self.db.execute(
+                "INSERT OR IGNORE INTO accounts (username, password_hash, salt, created_at,"
+                " last_login, banned, is_manual) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (username, account["password_hash"], account["salt"], account.get("created_at"),
+                 account.get("last_login"), int(bool(account.get("banned"))),
+                 int(bool(account.get("is_manual")))))
+            if cur.rowcount:
+                imported += 1
+            else:
+                print(f"[Accounts] Skipped '{username}' during migration: name already taken")
+        return imported
 
-    def _load_sessions(self):
-        """Load persisted sessions from disk so tokens survive server restarts."""
-        if os.path.exists(self.sessions_path):
-            try:
-                with open(self.sessions_path, 'r') as f:
-                    self.sessions = json.load(f)
-                print(f"Loaded {len(self.sessions)} sessions from {self.sessions_path}")
-            except Exception as e:
-                print(f"Warning: Could not load sessions: {e}")
-                self.sessions = {}
+    def _import_sessions(self, sessions):
+        now = time.time()
+        self.db.executemany("INSERT OR IGNORE INTO sessions (token, username, created_at, last_used)"
+                            " VALUES (?, ?, ?, ?)",
+                            ((token, username, now, now) for token, username in sessions.items()))
+        return len(sessions)
 
     def _save_sessions(self):
-        """Persist sessions to disk."""
-        try:
-            self._ensure_directory()
-            with open(self.sessions_path, 'w') as f:
-                json.dump(self.sessions, f, indent=2)
-        except Exception as e:
-            print(f"Error saving sessions: {e}")
+        """Write pending session changes to disk."""
+        return self.sessions.flush()
 
     def _load_manual_users(self):
         """Load manually-defined users from config."""
@@ -176,118 +417,237 @@ class AccountManager:
         added = 0
         for username, password in manual_users.items():
             username = username.strip()
-            if username in self.accounts:
-                # Update existing account's password
-                pw_hash, salt = self._hash_password(password)
-                self.accounts[username]["password_hash"] = pw_hash
-                self.accounts[username]["salt"] = salt
-                self.accounts[username]["is_manual"] = True
+            pw_hash, salt = self._hash_password(password)
+            cur = self.db.execute(
+                "UPDATE accounts SET password_hash = ?, salt = ?, is_manual = 1 WHERE username = ?",
+                (pw_hash, salt, username))
+            if cur.rowcount:
+                # Updated existing account's password
                 print(f"[Accounts] Updated password for manual user '{username}'")
             else:
-                # Create new account
-                pw_hash, salt = self._hash_password(password)
-                self.accounts[username] = {
-                    "password_hash": pw_hash,
-                    "salt": salt,
-                    "created_at": time.time(),
-                    "last_login": None,
-                    "banned": False,
-                    "is_manual": True
-                }
+                try:
+                    self.db.execute(
+                        "INSERT INTO accounts (username, password_hash, salt, created_at, banned, is_manual)"
+                        " VALUES (?, ?, ?, ?, 0, 1)", (username, pw_hash, salt, time.time()))
+                except sqlite3.IntegrityError:
+                    print(f"[Accounts] Cannot create manual user '{username}': name differs only in case "
+                          f"from an existing account")
+                    continue
                 print(f"[Accounts] Created manual user '{username}'")
             added += 1
 
         if added > 0:
-            self._save()
             print(f"[Accounts] Processed {added} manual user(s) from config")
 
-    def _hash_password(self, password, salt=None):
+    def _hash_password(self, password, salt=None, kdf=None):
+        """Hash a password with the configured KDF. Returns (stored_hash, salt).
+
+        Stored hashes are "<kdf>$<params>$<hex digest>"; a bare hex digest is
+        a legacy salted SHA-256 hash.
+        """
         if salt is None:
             salt = secrets.token_hex(16)
-        # Use SHA-256 with salt
+        kdf = kdf or self.kdf
+        if kdf == "scrypt":
+            return f"scrypt${self.scrypt_n}${self._kdf_digest('scrypt', self.scrypt_n, password, salt)}", salt
+        if kdf == "pbkdf2_sha256":
+            digest = self._kdf_digest('pbkdf2_sha256', self.pbkdf2_iterations, password, salt)
+            return f"pbkdf2_sha256${self.pbkdf2_iterations}${digest}", salt
+        # Legacy: SHA-256 with salt
         h = hashlib.sha256((salt + password).encode('utf-8')).hexdigest()
         return h, salt
 
+    @staticmethod
+    def _kdf_digest(kdf, cost, password, salt):
+        if kdf == "scrypt":
+            return hashlib.scrypt(password.encode('utf-8'), salt=salt.encode('utf-8'),
+                                  n=cost, r=8, p=1, maxmem=256 * cost * 8 + (1 << 20)).hex()
+        return hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt.encode('utf-8'), cost).hex()
+
+    def _verify_password(self, password, stored_hash, salt):
+        """Check a password. Returns (ok, new_hash) - new_hash is set when the
+        stored hash uses an outdated KDF or cost and should be replaced."""
+        parts = stored_hash.split('$')
+        if len(parts) == 3:
+            kdf, cost = parts[0], int(parts[1])
+            ok = hmac.compare_digest(self._kdf_digest(kdf, cost, password, salt), parts[2])
+            current = cost == (self.scrypt_n if kdf == "scrypt" else self.pbkdf2_iterations)
+            outdated = kdf != self.kdf or not current
+        else:
+            legacy, _ = self._hash_password(password, salt, kdf="sha256")
+            ok = hmac.compare_digest(legacy, stored_hash)
+            outdated = True
+        if ok and outdated:
+            return True, self._hash_password(password)
+        return ok, None
+
+    async def _offload(self, func, *args):
+        """Run a KDF call on the hashing pool, at most hash_workers at once.
+
+        Returns None without running it if max_pending_auth requests are
+        already waiting.
+        """
+        stats = self.auth_stats
+        if stats["pending"] >= self.max_pending_auth:
+            stats["busy_rejects"] += 1
+            return None
+        stats["pending"] += 1
+        try:
+            async with self._hash_slots:
+                return await asyncio.get_running_loop().run_in_executor(self.hash_executor, func, *args)
+        finally:
+            stats["pending"] -= 1
+
+    def _get_account(self, username):
+        return self.db.execute(
+            "SELECT password_hash, salt, banned FROM accounts WHERE username = ?", (username,)).fetchone()
+
     def register(self, username, password):
         """Register a new account. Returns (success, message)."""
         username = username.strip()
+        error = self._check_registration(username, password)
+        if error:
+            return False, error
+        return self._create_account(username, *self._hash_password(password))
+
+    async def register_async(self, username, password):
+        """register() with the password hashed off the event loop."""
+        username = username.strip()
+        error = self._check_registration(username, password)
+        if error:
+            return False, error
+        hashed = await self._offload(self._hash_password, password)
+        if hashed is None:
+            return False, "Server busy, please try again"
+        return self._create_account(username, *hashed)
+
+    def _check_registration(self, username, password):
         min_username = self.config['accounts']['min_username_length']
         max_username = self.config['accounts']['max_username_length']
         min_password = self.config['accounts']['min_password_length']
 
         if len(username) < min_username:
-            return False, f"Username must be at least {min_username} characters"
+            return f"Username must be at least {min_username} characters"
         if len(username) > max_username:
-            return False, f"Username must be at most {max_username} characters"
+            return f"Username must be at most {max_username} characters"
         if len(password) < min_password:
-            return False, f"Password must be at least {min_password} characters"
-        if username.lower() in [a.lower() for a in self.accounts]:
-            return False, "Username already taken"
+            return f"Password must be at least {min_password} characters"
+        if self.db.execute("SELECT 1 FROM accounts WHERE username = ? COLLATE NOCASE", (username,)).fetchone():
+            return "Username already taken"
         if not username.isalnum() and '_' not in username:
-            return False, "Username can only contain letters, numbers, and underscores"
+            return "Username can only contain letters, numbers, and underscores"
+        return None
 
-        pw_hash, salt = self._hash_password(password)
-        self.accounts[username] = {
-            "password_hash": pw_hash,
-            "salt": salt,
-            "created_at": time.time(),
-            "last_login": None,
-            "banned": False
-        }
-        self._save()
+    def _create_account(self, username, pw_hash, salt):
+        try:
+            self.db.execute(
+                "INSERT INTO accounts (username, password_hash, salt, created_at, banned)"
+                " VALUES (?, ?, ?, ?, 0)", (username, pw_hash, salt, time.time()))
+        except sqlite3.IntegrityError:
+            return False, "Username already taken"
+        self.auth_stats["registrations"] += 1
         return True, "Account created successfully"
 
     def login(self, username, password):
         """Login and return a session token. Returns (success, message, token)."""
         username = username.strip()
-        account = self.accounts.get(username)
+        account = self._get_account(username)
         if not account:
             return False, "Invalid username or password", None
-        if account.get("banned"):
+        stored_hash, salt, banned = account
+        if banned:
             return False, "This account has been banned", None
+        ok, new_hash = self._verify_password(password, stored_hash, salt)
+        return self._finish_login(username, ok, new_hash)
+
+    async def login_async(self, username, password):
+        """login() with the password check run off the event loop."""
+        start = time.perf_counter()
+        try:
+            username = username.strip()
+            account = self._get_account(username)
+            if not account:
+                return False, "Invalid username or password", None
+            stored_hash, salt, banned = account
+            if banned:
+                return False, "This account has been banned", None
+            verified = await self._offload(self._verify_password, password, stored_hash, salt)
+            if verified is None:
+                return False, "Server busy, please try again", None
+            return self._finish_login(username, *verified)
+        finally:
+            self.login_times.append(time.perf_counter() - start)
 
-        pw_hash, _ = self._hash_password(password, account["salt"])
-        if pw_hash != account["password_hash"]:
+    def _finish_login(self, username, ok, new_hash):
+        if not ok:
+            self.auth_stats["failed_logins"] += 1
             return False, "Invalid username or password", None
 
-        token = secrets.token_hex(32)
-        self.sessions[token] = username
-        account["last_login"] = time.time()
-        self._save()
-        self._save_sessions()
-        return True, "Login successful", token
+        self.db.execute("BEGIN")
+        self.db.execute("UPDATE accounts SET last_login = ? WHERE username = ?", (time.time(), username))
+        if new_hash is not None:
+            # Transparently move the account to the current KDF
+            self.db.execute("UPDATE accounts SET password_hash = ?, salt = ? WHERE username = ?",
+                            (new_hash[0], new_hash[1], username))
+            self.auth_stats["upgraded_hashes"] += 1
+        self.db.execute("COMMIT")
+        self.auth_stats["logins"] += 1
+        # The session row is written by the next batched flush
+        return True, "Login successful", self.sessions.create(username)
+
+    def login_latency(self):
+        """Percentiles (ms) over the recent login_async calls."""
+        times = sorted(self.login_times)
+        if not times:
+            return {"count": 0, "p50": 0.0, "p99": 0.0, "max": 0.0}
+        pick = lambda q: times[min(len(times) - 1, int(q * len(times)))] * 1000
+        return {"count": len(times), "p50": pick(0.50), "p99": pick(0.99), "max": times[-1] * 1000}
+
+    def report_login_latency(self):
+        """Print login latency if there were logins since the last report."""
+        total = self.auth_stats["logins"] + self.auth_stats["failed_logins"]
+        if total == self._reported_logins:
+            return
+        self._reported_logins = total
+        lat = self.login_latency()
+        print(f"[Accounts] Login latency over last {lat['count']}: p50 {lat['p50']:.1f}ms, "
+              f"p99 {lat['p99']:.1f}ms, max {lat['max']:.1f}ms ({self.auth_stats['busy_rejects']} busy rejects)")
 
     def validate_session(self, token):
         """Validate a session token. Returns username or None."""
-        return self.sessions.get(token)
+        return self.sessions.validate(token)
 
     def logout(self, token):
         """Remove a session token."""
-        self.sessions.pop(token, None)
+        self.sessions.revoke(token)
 
     def is_banned(self, username):
-        account = self.accounts.get(username)
-        return account and account.get("banned", False)
+        account = self._get_account(username)
+        return bool(account and account[2])
+
+    def _set_banned(self, username, banned):
+        cur = self.db.execute("UPDATE accounts SET banned = ? WHERE username = ?", (int(banned), username))
+        return cur.rowcount > 0
 
     def ban_user(self, username):
-        account = self.accounts.get(username)
-        if account:
-            account["banned"] = True
-            self._save()
+        if self._set_banned(username, True):
+            self.sessions.revoke_user(username)
             return True
         return False
 
     def unban_user(self, username):
-        account = self.accounts.get(username)
-        if account:
-            account["banned"] = False
-            self._save()
-            return True
-        return False
+        return self._set_banned(username, False)
 
     def get_account_count(self):
         """Return the number of registered accounts."""
-        return len(self.accounts)
+        return self.db.execute("SELECT COUNT(*) FROM accounts").fetchone()[0]
+
+    def close(self):
+        self.hash_executor.shutdown(wait=False, cancel_futures=True)
+        try:
+            self.db.close()
+        except sqlite3.Error:
+            pass
 
 
 # ============================================================================
@@ -338,26 +698,680 @@ def procedural_tile(x, y, seed, mw, mh):
     return base
 
 
+# Reference output of procedural_tile, used to check the vectorized generator
+PROCEDURAL_GOLDEN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "procedural_golden.json")
+
+
+def procedural_region(x0, y0, w, h, seed, mw, mh):
+    """Vectorized procedural_tile over a w x h rectangle.
+
+    Returns a (h, w) uint8 NumPy array whose [row][col] entry equals
+    procedural_tile(x0 + col, y0 + row, ...). Requires NumPy.
+    """
+    if np is None:
+        raise RuntimeError("procedural_region requires numpy")
+    ys = np.arange(y0, y0 + h, dtype=np.float64)[:, None]
+    xs = np.arange(x0, x0 + w, dtype=np.float64)[None, :]
+
+    # Same operation order as the scalar version so results are bit-identical
+    s = np.sin(xs * 12.9898 + ys * 78.233 + seed) * 43758.5453
+    r = s - np.floor(s)
+    s2 = np.sin(xs * 12.9898 + (ys + 10000) * 78.233 + seed) * 43758.5453
+    ore_roll = s2 - np.floor(s2)
+
+    base = np.select([ys > 300, ys > 100, ys > 30], [5, 4, 3], default=1)
+    rare = r > 0.985
+    conditions = [
+        np.broadcast_to(ys < 5, r.shape),
+        np.broadcast_to(ys == 5, r.shape),
+        np.broadcast_to(ys >= mh - 1, r.shape),
+        rare & (ys > 400) & (ore_roll < 0.2),
+        rare & (ys > 250) & (ore_roll < 0.6),
+        rare & (ys > 150),
+        r > 0.9999,
+        (r > 0.96) & (ys > 100),
+        (r > 0.94) & (ys > 50),
+        r > 0.94,
+    ]
+    choices = [0, 2, 99, 11, 10, 9, 67, 8, 7, 6]
+    return np.select(conditions, choices, default=np.broadcast_to(base, r.shape)).astype(np.uint8)
+
+
+def procedural_region_bytes(x0, y0, w, h, seed, mw, mh, vectorized=True):
+    """Procedural tiles for a rectangle as a row-major bytearray.
+
+    Uses procedural_region when NumPy is available, otherwise falls back to
+    calling procedural_tile per tile.
+    """
+    if vectorized and np is not None:
+        return bytearray(procedural_region(x0, y0, w, h, seed, mw, mh).tobytes())
+    buf = bytearray(w * h)
+    i = 0
+    for y in range(y0, y0 + h):
+        for x in range(x0, x0 + w):
+            buf[i] = procedural_tile(x, y, seed, mw, mh)
+            i += 1
+    return buf
+
+
+def verify_procedural_region(golden_path=PROCEDURAL_GOLDEN_PATH):
+    """Check procedural_region against the checked-in golden vectors.
+
+    Returns (ok, message). Regions are stored as one hex string per row.
+    """
+    if np is None:
+        return False, "numpy not installed"
+    try:
+        with open(golden_path, 'r') as f:
+            golden = json.load(f)
+    except Exception as e:
+        return False, f"could not read golden vectors: {e}"
+    mw, mh = golden["map_width"], golden["map_height"]
+    for case in golden["regions"]:
+        expected = bytes.fromhex("".join(case["rows"]))
+        actual = procedural_region(case["x"], case["y"], case["w"], case["h"],
+                                   case["seed"], mw, mh).tobytes()
+        if actual != expected:
+            return False, f"mismatch in region {case['x']},{case['y']} seed {case['seed']}"
+    return True, f"{len(golden['regions'])} regions match"
+
+
+CHUNK_SIZE = 32  # Tiles per side of a world chunk
+FALLING_TILES = frozenset((23, 24))  # GRAVEL, SAND - fall into EMPTY space below
+BEDROCK = 99
+
+MAX_AOE_RADIUS = 16  # Largest multi-mine radius accepted from a client
+MAX_DRILL_TIER = 4  # Highest drill tier in the client; mined tiles need tier 0-4
+MAX_EXPLOSION_RADIUS = 32  # Largest TNT/Nuke radius accepted from a client (the client uses 3 and 10)
+MAX_CLEAR_RADIUS = MAX_EXPLOSION_RADIUS  # Largest area WorldManager.clear_tiles applies
+
+# 256-entry lookup of tile values an explosion may clear
+EXPLOSION_CLEARABLE = bytes(0 < v != BEDROCK for v in range(256))
+_TILE_MASKS = {}  # (radius, circular) -> mask; radii are capped at MAX_CLEAR_RADIUS
+
+
+def tile_mask(radius, circular=True):
+    """Return the (2r+1) x (2r+1) area mask for a radius, cached per shape.
+
+    A NumPy bool array when NumPy is available, else a list of (dx, dy)
+    offsets. The circle matches the client's sqrt(dx^2 + dy^2) <= r test.
+    The radius is clamped to MAX_CLEAR_RADIUS, which also bounds the cache.
+    """
+    radius = max(0, min(radius, MAX_CLEAR_RADIUS))
+    key = (radius, circular)
+    mask = _TILE_MASKS.get(key)
+    if mask is None:
+        if np is not None:
+            d = np.arange(-radius, radius + 1)
+            if circular:
+                mask = (d[:, None] ** 2 + d[None, :] ** 2) <= radius * radius
+            else:
+                mask = np.ones((2 * radius + 1, 2 * radius + 1), dtype=bool)
+        else:
+            mask = [(dx, dy) for dy in range(-radius, radius + 1) for dx in range(-radius, radius + 1)
+                    if not circular or dx * dx + dy * dy <= radius * radius]
+        _TILE_MASKS[key] = mask
+    return mask
+
+
+def chunk_of(x, y):
+    """Return the (cx, cy) chunk coordinate containing tile (x, y)."""
+    return x // CHUNK_SIZE, y // CHUNK_SIZE
+
+
+_DIFF_ENTRY = struct.Struct("<HHB")
+
+
+class TileOverlay:
+    """Hash index over a world's diff list, partitioned into chunks.
+
+    The persisted ``diffs`` list stays the source of truth for saving and map
+    sync; this keeps a ``(x, y) -> position`` index into it so reads, writes
+    and removals are O(1) instead of a scan over every diff. Entries are also
+    grouped into CHUNK_SIZE x CHUNK_SIZE chunks so region queries only visit
+    the chunks they overlap. Each chunk carries a version that is bumped on
+    every change inside it.
+    """
+
+    def __init__(self, diffs):
+        self.diffs = diffs
+        self.index = {}
+        self.chunks = {}  # (cx, cy) -> { (x, y): [x, y, value] }
+        self.chunk_versions = {}  # (cx, cy) -> change counter
+        self.chunk_hashes = {}  # (cx, cy) -> (version, content hash)
+        self.version = 0
+        # Older saves may contain duplicate coordinates - last entry wins
+        deduped = []
+        for entry in diffs:
+            key = (entry[0], entry[1])
+            pos = self.index.get(key)
+            if pos is None:
+                self.index[key] = len(deduped)
+                deduped.append(entry)
+            else:
+                deduped[pos] = entry
+            self.chunks.setdefault(chunk_of(*key), {})[key] = deduped[self.index[key]]
+        diffs[:] = deduped
+
+    def __len__(self):
+        return len(self.diffs)
+
+    def _touch(self, chunk):
+        self.chunk_versions[chunk] = self.chunk_versions.get(chunk, 0) + 1
+        self.version += 1
+
+    def get(self, x, y, default=None):
+        pos = self.index.get((x, y))
+        if pos is None:
+            return default
+        return self.diffs[pos][2]
+
+    def set(self, x, y, value):
+        key = (x, y)
+        chunk = chunk_of(x, y)
+        pos = self.index.get(key)
+        if pos is None:
+            entry = [x, y, value]
+            self.index[key] = len(self.diffs)
+            self.diffs.append(entry)
+            self.chunks.setdefault(chunk, {})[key] = entry
+        else:
+            self.diffs[pos][2] = value
+        self._touch(chunk)
+
+    def delete(self, x, y):
+        """Remove a diff by swapping the last entry into its slot."""
+        key = (x, y)
+        pos = self.index.pop(key, None)
+        if pos is None:
+            return False
+        last = self.diffs.pop()
+        if pos < len(self.diffs):
+            self.diffs[pos] = last
+            self.index[(last[0], last[1])] = pos
+        chunk = chunk_of(x, y)
+        entries = self.chunks.get(chunk)
+        if entries is not None:
+            entries.pop(key, None)
+            if not entries:
+                del self.chunks[chunk]
+        self._touch(chunk)
+        return True
+
+    def chunk_entries(self, cx, cy):
+        """Return the diff entries stored in one chunk."""
+        return list(self.chunks.get((cx, cy), {}).values())
+
+    def query(self, bx, by, bw, bh):
+        """Return diffs inside the rectangle, visiting only overlapping chunks."""
+        if bw <= 0 or bh <= 0:
+            return []
+        x_end = bx + bw
+        y_end = by + bh
+        cx0, cy0 = chunk_of(bx, by)
+        cx1, cy1 = chunk_of(x_end - 1, y_end - 1)
+        result = []
+        for cy in range(cy0, cy1 + 1):
+            for cx in range(cx0, cx1 + 1):
+                entries = self.chunks.get((cx, cy))
+                if not entries:
+                    continue
+                for x, y, val in entries.values():
+                    if bx <= x < x_end and by <= y < y_end:
+                        result.append([x, y, val])
+        return result
+
+    def chunk_hash(self, chunk):
+        """Return a content hash of a chunk's diffs ("" for an untouched chunk).
+
+        Unlike chunk versions, hashes survive a server restart, so clients can
+        use them to tell which of their cached chunks are still current.
+        """
+        entries = self.chunks.get(chunk)
+        if not entries:
+            return ""
+        version = self.chunk_versions.get(chunk, 0)
+        cached = self.chunk_hashes.get(chunk)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        digest = hashlib.blake2b(digest_size=8)
+        for x, y, value in sorted(entries.values()):
+            digest.update(_DIFF_ENTRY.pack(x, y, value))
+        content_hash = digest.hexdigest()
+        self.chunk_hashes[chunk] = (version, content_hash)
+        return content_hash
+
+    def manifest(self):
+        """Return { (cx, cy): content hash } for every chunk holding diffs."""
+        return {chunk: self.chunk_hash(chunk) for chunk in self.chunks}
+
+    def chunk_stats(self):
+        """Return { (cx, cy): (diff_count, version) } for every touched chunk."""
+        stats = {}
+        for chunk, version in self.chunk_versions.items():
+            stats[chunk] = (len(self.chunks.get(chunk, ())), version)
+        for chunk, entries in self.chunks.items():
+            if chunk not in stats:
+                stats[chunk] = (len(entries), 0)
+        return stats
+
+
+class ChunkCache:
+    """Bounded LRU cache of materialized terrain chunks.
+
+    Each entry is a CHUNK_SIZE x CHUNK_SIZE row-major bytearray holding the
+    procedural base with the world's diffs applied, keyed by
+    (world_name, cx, cy). Entries are evicted least-recently-used first once
+    the memory budget is exceeded.
+    """
+
+    ENTRY_BYTES = sys.getsizeof(bytearray(CHUNK_SIZE * CHUNK_SIZE))
+
+    def __init__(self, max_bytes):
+        self.max_entries = max(1, max_bytes // self.ENTRY_BYTES)
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        buf = self.entries.get(key)
+        if buf is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return buf
+
+    def peek(self, key):
+        """Look up an entry without touching LRU order or counters."""
+        return self.entries.get(key)
+
+    def put(self, key, buf):
+        self.entries[key] = buf
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def drop_world(self, world_name):
+        for key in [k for k in self.entries if k[0] == world_name]:
+            del self.entries[key]
+
+    def stats(self):
+        return {
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "bytes": len(self.entries) * self.ENTRY_BYTES,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+
+# ============================================================================
+# WORLD SAVE FORMAT
+# ============================================================================
+#
+# Binary world file (little-endian), version 1:
+#   magic "MMWD" | u16 version | u32 meta_len | meta JSON (utf-8)
+#   u32 chunk_count, then per chunk:
+#     i32 cx | i32 cy | u32 n | n x u16 x | n x u16 y | n x u8 value
+#
+# "meta" holds every world key except diffs and player_data. Player data is
+# stored next to the world file as world_<name>.players.json.
+
+WORLD_MAGIC = b"MMWD"
+WORLD_FORMAT_VERSION = 1
+_WORLD_HEADER = struct.Struct("<4sHI")
+_CHUNK_HEADER = struct.Struct("<iiI")
+
+
+def _le_bytes(arr):
+    """Serialize an array.array in little-endian byte order."""
+    if sys.byteorder != "little":
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def _le_array(typecode, data):
+    arr = array(typecode)
+    arr.frombytes(data)
+    if sys.byteorder != "little":
+        arr.byteswap()
+    return arr
+
+
+def encode_chunk_diffs(cx, cy, entries):
+    """Pack one chunk's [x, y, value] entries into a chunk record."""
+    xs = array('H')
+    ys = array('H')
+    vals = bytearray()
+    for x, y, val in entries:
+        if 0 <= x <= 0xFFFF and 0 <= y <= 0xFFFF and 0 <= val <= 0xFF:
+            xs.append(x)
+            ys.append(y)
+            vals.append(val)
+    return _CHUNK_HEADER.pack(cx, cy, len(vals)) + _le_bytes(xs) + _le_bytes(ys) + bytes(vals)
+
+
+def encode_world_binary(world, chunk_records):
+    """Build a binary world file from world metadata and packed chunk records."""
+    meta = {k: v for k, v in world.items() if k not in ('diffs', 'player_data')}
+    meta_bytes = json.dumps(meta, separators=(',', ':')).encode('utf-8')
+    parts = [_WORLD_HEADER.pack(WORLD_MAGIC, WORLD_FORMAT_VERSION, len(meta_bytes)), meta_bytes,
+             struct.pack("<I", len(chunk_records))]
+    parts.extend(chunk_records)
+    return b"".join(parts)
+
+
+def decode_world_binary(data):
+    """Parse a binary world file into a world dict (without player_data)."""
+    magic, version, meta_len = _WORLD_HEADER.unpack_from(data, 0)
+    if magic != WORLD_MAGIC:
+        raise ValueError("not a Mega Miner world file")
+    if version > WORLD_FORMAT_VERSION:
+        raise ValueError(f"unsupported world format version {version}")
+    offset = _WORLD_HEADER.size
+    world = json.loads(data[offset:offset + meta_len].decode('utf-8'))
+    offset += meta_len
+    (chunk_count,) = struct.unpack_from("<I", data, offset)
+    offset += 4
+    diffs = []
+    for _ in range(chunk_count):
+        _, _, n = _CHUNK_HEADER.unpack_from(data, offset)
+        offset += _CHUNK_HEADER.size
+        xs = _le_array('H', data[offset:offset + 2 * n])
+        offset += 2 * n
+        ys = _le_array('H', data[offset:offset + 2 * n])
+        offset += 2 * n
+        vals = data[offset:offset + n]
+        offset += n
+        diffs.extend([x, y, v] for x, y, v in zip(xs, ys, vals))
+    world['diffs'] = diffs
+    return world
+
+
+def atomic_write(path, data, mode='wb'):
+    """Write a file via a temp file and rename so readers never see a partial write."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, mode) as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def fsync_fd(fd):
+    """fsync and close a file descriptor (a dup, so the owner may close its own)."""
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+# Tile journal (write-ahead log), little-endian:
+#   magic "MMWJ" | u16 version, then repeated records of u16 x | u16 y | u8 value
+# Replaying a journal sets each tile in order, so replaying records that are
+# already in the snapshot is harmless.
+
+JOURNAL_MAGIC = b"MMWJ"
+JOURNAL_FORMAT_VERSION = 1
+_JOURNAL_HEADER = struct.Struct("<4sH")
+_JOURNAL_RECORD = struct.Struct("<HHB")
+
+
+def read_journal(path):
+    """Read tile records from a journal file.
+
+    Returns (records, valid_length); a torn record at the end (from a crash
+    mid-append) is ignored and excluded from valid_length.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < _JOURNAL_HEADER.size:
+        return [], 0
+    magic, version = _JOURNAL_HEADER.unpack_from(data, 0)
+    if magic != JOURNAL_MAGIC or version > JOURNAL_FORMAT_VERSION:
+        raise ValueError(f"not a supported tile journal: {path}")
+    body = len(data) - _JOURNAL_HEADER.size
+    valid = _JOURNAL_HEADER.size + body - body % _JOURNAL_RECORD.size
+    records = list(_JOURNAL_RECORD.iter_unpack(data[_JOURNAL_HEADER.size:valid]))
+    return records, valid
+
+
+def read_legacy_world(path):
+    """Read a world saved in the original pretty-printed JSON format."""
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def convert_legacy_world(json_path, out_path=None):
+    """Convert a legacy JSON world file to the binary format.
+
+    Writes <name>.mmw and <name>.players.json next to the JSON file unless
+    out_path is given. Returns (out_path, diff_count).
+    """
+    world = read_legacy_world(json_path)
+    if out_path is None:
+        out_path = os.path.splitext(json_path)[0] + ".mmw"
+    overlay = TileOverlay(world.setdefault('diffs', []))
+    records = [encode_chunk_diffs(cx, cy, entries.values())
+               for (cx, cy), entries in sorted(overlay.chunks.items())]
+    atomic_write(out_path, encode_world_binary(world, records))
+    players_path = os.path.splitext(out_path)[0] + ".players.json"
+    atomic_write(players_path, json.dumps(world.get('player_data', {}), separators=(',', ':')), 'w')
+    return out_path, len(overlay)
+
+
 class WorldManager:
     """Handles persistent world data with autosaving.
     
     Only stores diffs (changes from procedural generation) to keep
     save files small and map sync fast.
+
+    Changes are persisted write-behind: mutations mark the world (and the
+    touched chunk) dirty, and flush_dirty_async() writes each dirty world at
+    most save_max_delay seconds after its first unsaved change. Only dirty
+    chunks are re-encoded on save.
+
+    With the journal enabled, tile changes are instead appended to
+    world_<name>.wal as they happen and do not start the save timer. A
+    snapshot save rotates the journal to .wal.1 and deletes it once the
+    snapshot is on disk; the journal is compacted this way once it passes
+    journal_max_bytes or journal_max_age. load_world replays the snapshot
+    plus any journal left behind. Journal writes are flushed to the OS at
+    once, which survives a server crash; sync_journals_async() fsyncs them
+    so a power loss or OS crash only loses changes since the last sync.
     """
 
-    def __init__(self, worlds_directory, mw, mh):
+    def __init__(self, worlds_directory, mw, mh, chunk_cache_mb=32, save_max_delay=5,
+                 journal_enabled=True, journal_max_bytes=4 * 1024 * 1024, journal_max_age=300):
         self.worlds_directory = worlds_directory
         self.mw = mw
         self.mh = mh
         self.worlds = {}  # world_name -> { diffs, player_data, metadata }
+        self.overlays = {}  # world_name -> TileOverlay over world['diffs']
+        self.chunk_cache = ChunkCache(int(chunk_cache_mb * 1024 * 1024))
+        self.save_max_delay = save_max_delay
+        self.journal_enabled = journal_enabled
+        self.journal_max_bytes = journal_max_bytes
+        self.journal_max_age = journal_max_age
+        self.journals = {}  # world_name -> { file, bytes, since, unsynced }
+        self.dirty_since = {}  # world_name -> time of first unsaved change
+        self.dirty_chunks = {}  # world_name -> set of (cx, cy) changed since last save
+        self.chunk_records = {}  # world_name -> { (cx, cy): packed chunk record }
+        self.map_snapshots = {}  # (world_name, binary) -> MapSnapshot
+        self.unstable = {}  # world_name -> {(x, y)} falling tiles that may need to move
+        self.scanned_chunks = {}  # world_name -> {(cx, cy)} already searched for unstable tiles
+        self.snapshot_stats = {"builds": 0, "hits": 0, "last_build": 0.0}
+        self.save_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="world-save")
+        self.saving = {}  # world_name -> in-flight save future
+        self.save_stats = {"count": 0, "failures": 0, "skipped": 0, "total_duration": 0.0,
+                           "last_duration": 0.0, "max_duration": 0.0, "last_loop_time": 0.0}
+        self.vectorized_terrain, msg = verify_procedural_region()
+        print(f"[Terrain] Vectorized generation {'enabled' if self.vectorized_terrain else 'disabled'} ({msg})")
         self._ensure_directory()
 
     def _ensure_directory(self):
         os.makedirs(self.worlds_directory, exist_ok=True)
 
-    def _world_path(self, world_name):
+    def _world_path(self, world_name, ext=".json"):
         safe_name = "".join(c if c.isalnum() or c in '_-' else '_' for c in world_name)
-        return os.path.join(self.worlds_directory, f"world_{safe_name}.json")
+        return os.path.join(self.worlds_directory, f"world_{safe_name}{ext}")
+
+    def _binary_path(self, world_name):
+        return self._world_path(world_name, ".mmw")
+
+    def _players_path(self, world_name):
+        return self._world_path(world_name, ".players.json")
+
+    def _journal_path(self, world_name, rotated=False):
+        return self._world_path(world_name, ".wal.1" if rotated else ".wal")
+
+    def _read_world(self, world_name):
+        """Read a world from disk, preferring the binary format over legacy JSON."""
+        path = self._binary_path(world_name)
+        if os.path.exists(path):
+            print(f"[Load] Reading binary world from {path}")
+            with open(path, 'rb') as f:
+                data = decode_world_binary(f.read())
+            players_path = self._players_path(world_name)
+            data['player_data'] = {}
+            if os.path.exists(players_path):
+                with open(players_path, 'r') as f:
+                    data['player_data'] = json.load(f)
+            return data
+        path = self._world_path(world_name)
+        if os.path.exists(path):
+            print(f"[Load] Reading legacy JSON world from {path}")
+            return read_legacy_world(path)
+        return None
+
+    def _overlay(self, world):
+        """Return the tile index for a world dict, building it on first use."""
+        world_name = world.get('world_name')
+        overlay = self.overlays.get(world_name)
+        if overlay is None or overlay.diffs is not world.get('diffs'):
+            overlay = TileOverlay(world.setdefault('diffs', []))
+            self.overlays[world_name] = overlay
+            self.chunk_cache.drop_world(world_name)
+            self.chunk_records.pop(world_name, None)
+        return overlay
+
+    def mark_dirty(self, world_name, chunk=None):
+        """Flag a world (and optionally one of its chunks) as needing a save.
+
+        Chunk changes only start the save timer when the journal is off, since
+        journaled tile changes are already on disk (see sync_journals_async).
+        """
+        if chunk is None or not self.journal_enabled:
+            self.dirty_since.setdefault(world_name, time.time())
+        if chunk is not None:
+            self.dirty_chunks.setdefault(world_name, set()).add(chunk)
+
+    # -- Tile journal ---------------------------------------------------------
+
+    def _journal_append(self, world_name, x, y, value):
+        self._journal_write(world_name, _JOURNAL_RECORD.pack(x, y, value))
+
+    def _journal_write(self, world_name, records):
+        journal = self.journals.get(world_name)
+        if journal is None:
+            path = self._journal_path(world_name)
+            f = open(path, 'ab')
+            if f.tell() == 0:
+                f.write(_JOURNAL_HEADER.pack(JOURNAL_MAGIC, JOURNAL_FORMAT_VERSION))
+            journal = {"file": f, "bytes": f.tell(), "since": time.time(), "unsynced": False}
+            self.journals[world_name] = journal
+        journal["file"].write(records)
+        journal["file"].flush()
+        journal["bytes"] += len(records)
+        journal["unsynced"] = True
+
+    async def sync_journals_async(self):
+        """fsync journals written since their last sync, off the event loop."""
+        loop = asyncio.get_running_loop()
+        for world_name, journal in list(self.journals.items()):
+            if not journal["unsynced"]:
+                continue
+            journal["unsynced"] = False
+            try:
+                # A dup stays valid if the journal is rotated meanwhile
+                await loop.run_in_executor(self.save_executor, fsync_fd, os.dup(journal["file"].fileno()))
+            except (OSError, ValueError) as e:
+                journal["unsynced"] = True
+                print(f"[Journal] Could not sync journal of '{world_name}': {e}")
+
+    def _close_journal(self, world_name):
+        journal = self.journals.pop(world_name, None)
+        if journal is not None:
+            journal["file"].close()
+
+    def _rotate_journal(self, world_name):
+        """Move the live journal aside before a snapshot (merging any older leftover)."""
+        self._close_journal(world_name)
+        path = self._journal_path(world_name)
+        rotated = self._journal_path(world_name, rotated=True)
+        if not os.path.exists(path):
+            return
+        if os.path.exists(rotated):
+            # A previous snapshot never completed - keep its records in front
+            with open(path, 'rb') as src, open(rotated, 'ab') as dst:
+                dst.write(src.read()[_JOURNAL_HEADER.size:])
+            os.remove(path)
+        else:
+            os.replace(path, rotated)
+
+    def _replay_journals(self, world):
+        """Apply journal records left on disk to a freshly loaded world."""
+        world_name = world['world_name']
+        replayed = 0
+        for path in (self._journal_path(world_name, rotated=True), self._journal_path(world_name)):
+            if not os.path.exists(path):
+                continue
+            records, valid = read_journal(path)
+            if valid < os.path.getsize(path):
+                print(f"[Load] Dropping torn record at end of {path}")
+                with open(path, 'r+b') as f:
+                    f.truncate(valid)
+            for x, y, value in records:
+                self._set_tile(world, x, y, value)
+            replayed += len(records)
+        if replayed:
+            print(f"[Load] Replayed {replayed} journaled tile change(s) for '{world_name}'")
+            # Fold the replayed journal into a fresh snapshot soon
+            self.mark_dirty(world_name)
+        return replayed
+
+    def _journal_due(self, world_name, now):
+        journal = self.journals.get(world_name)
+        if journal is None:
+            return False
+        return (journal["bytes"] >= self.journal_max_bytes
+                or now - journal["since"] >= self.journal_max_age)
+
+    def is_dirty(self, world_name):
+        return world_name in self.dirty_since
+
+    def _chunk(self, world, cx, cy):
+        """Return the materialized tiles of a chunk, generating it on a cache miss."""
+        key = (world.get('world_name'), cx, cy)
+        buf = self.chunk_cache.get(key)
+        if buf is not None:
+            return buf
+        x0 = cx * CHUNK_SIZE
+        y0 = cy * CHUNK_SIZE
+        buf = procedural_region_bytes(x0, y0, CHUNK_SIZE, CHUNK_SIZE, world['procedural_seed'],
+                                      self.mw, self.mh, vectorized=self.vectorized_terrain)
+        for x, y, val in self._overlay(world).chunk_entries(cx, cy):
+            buf[(y - y0) * CHUNK_SIZE + (x - x0)] = val
+        self.chunk_cache.put(key, buf)
+        return buf
 
     def load_world(self, world_name):
         """Load a world from disk, or create a new one."""
@@ -365,21 +1379,20 @@ class WorldManager:
             print(f"[Load] World '{world_name}' already in memory")
             return self.worlds[world_name]
 
-        path = self._world_path(world_name)
-        print(f"[Load] Attempting to load world '{world_name}' from {path}")
-        print(f"[Load] File exists: {os.path.exists(path)}")
-        
-        if os.path.exists(path):
-            try:
-                with open(path, 'r') as f:
-                    data = json.load(f)
+        print(f"[Load] Attempting to load world '{world_name}' from {self.worlds_directory}")
+        try:
+            data = self._read_world(world_name)
+            if data is not None:
                 self.worlds[world_name] = data
+                data.setdefault('world_name', world_name)
+                self._overlay(data)
+                self._replay_journals(data)
                 diffs_count = len(data.get('diffs', []))
                 players_count = len(data.get('player_data', {}))
                 print(f"[Load] Successfully loaded world '{world_name}' ({diffs_count} diffs, {players_count} players)")
                 return data
-            except Exception as e:
-                print(f"[Load] Error loading world '{world_name}': {e}")
+        except Exception as e:
+            print(f"[Load] Error loading world '{world_name}': {e}")
 
         # Create new world
         world = {
@@ -392,40 +1405,169 @@ class WorldManager:
             "procedural_seed": abs(hash(world_name)) % (2**31)
         }
         self.worlds[world_name] = world
+        self._overlay(world)
+        # Replay journal from a crash before this world's first snapshot
+        self._replay_journals(world)
+        # Persist the seed promptly - journaled tiles are relative to it
+        self.mark_dirty(world_name)
         print(f"[Load] Created new world '{world_name}' (seed: {world['procedural_seed']})")
         return world
 
     def get_tile(self, world, x, y):
-        """Get tile value at (x,y), checking diffs first then procedural."""
-        # Check diffs first
-        for dx, dy, val in world.get('diffs', []):
-            if dx == x and dy == y:
-                return val
-        # Fall back to procedural
-        return procedural_tile(x, y, world['procedural_seed'], self.mw, self.mh)
+        """Get tile value at (x,y) from the cached chunk (procedural plus diffs)."""
+        cx, cy = chunk_of(x, y)
+        buf = self._chunk(world, cx, cy)
+        return buf[(y - cy * CHUNK_SIZE) * CHUNK_SIZE + (x - cx * CHUNK_SIZE)]
 
     def update_tile(self, world_name, x, y, value):
         """Update a single tile. Stores as a diff from procedural."""
         world = self.worlds.get(world_name)
         if not world:
             return False
+        if not all(isinstance(v, int) for v in (x, y, value)):
+            return False
         if y < 0 or y >= self.mh or x < 0 or x >= self.mw:
             return False
-        
+        if not 0 <= value <= 0xFF:
+            return False
+
+        chunk = self._set_tile(world, x, y, value)
+        if self.journal_enabled:
+            self._journal_append(world_name, x, y, value)
+        self.mark_dirty(world_name, chunk)
+        # Wake the tile itself and whatever rests on it for the falling-block sim
+        if value in FALLING_TILES:
+            self.unstable.setdefault(world_name, set()).add((x, y))
+        if y > 0 and self.get_tile(world, x, y - 1) in FALLING_TILES:
+            self.unstable.setdefault(world_name, set()).add((x, y - 1))
+        return True
+
+    def scan_unstable(self, world_name, cx, cy):
+        """Queue every falling tile of a chunk that has EMPTY below it.
+
+        Each chunk is searched once per load, which catches Gravel/Sand from
+        saved diffs that lost its support before the world was last saved.
+        """
+        world = self.worlds.get(world_name)
+        scanned = self.scanned_chunks.setdefault(world_name, set())
+        if not world or (cx, cy) in scanned:
+            return
+        scanned.add((cx, cy))
+        buf = self._chunk(world, cx, cy)
+        found = self.unstable.setdefault(world_name, set())
+        for tile in FALLING_TILES:
+            i = buf.find(tile)
+            while i != -1:
+                x = cx * CHUNK_SIZE + i % CHUNK_SIZE
+                y = cy * CHUNK_SIZE + i // CHUNK_SIZE
+                if x < self.mw and y < self.mh - 1 and self.get_tile(world, x, y + 1) == 0:
+                    found.add((x, y))
+                i = buf.find(tile, i + 1)
+
+    def take_unstable(self, world_name):
+        """Return and clear the set of falling tiles woken since the last call."""
+        return self.unstable.pop(world_name, set())
+
+    def _set_tile(self, world, x, y, value):
+        """Apply a tile change to the overlay and chunk cache. Returns its chunk."""
         # Check if this tile matches procedural (if so, remove from diffs)
         base = procedural_tile(x, y, world['procedural_seed'], self.mw, self.mh)
-        if value == base:
+        self._record_tile(world, x, y, value, value == base)
+        # Keep a cached copy of the chunk in sync
+        cx, cy = chunk_of(x, y)
+        buf = self.chunk_cache.peek((world.get('world_name'), cx, cy))
+        if buf is not None:
+            buf[(y - cy * CHUNK_SIZE) * CHUNK_SIZE + (x - cx * CHUNK_SIZE)] = value
+        return cx, cy
+
+    def _record_tile(self, world, x, y, value, is_base):
+        """Store a tile change in the overlay (dropping the diff if it matches procedural)."""
+        overlay = self._overlay(world)
+        if is_base:
             # Remove from diffs if present
-            world['diffs'] = [d for d in world['diffs'] if not (d[0] == x and d[1] == y)]
+            overlay.delete(x, y)
         else:
             # Add or update diff
-            for i, (dx, dy, _) in enumerate(world['diffs']):
-                if dx == x and dy == y:
-                    world['diffs'][i][2] = value
-                    break
-            else:
-                world['diffs'].append([x, y, value])
-        return True
+            overlay.set(x, y, value)
+        world_name = world.get('world_name')
+        for binary in (False, True):
+            snapshot = self.map_snapshots.get((world_name, binary))
+            if snapshot is not None:
+                snapshot.changed.add((x, y))
+                if len(snapshot.changed) > snapshot.patch_limit:
+                    # Stale anyway - drop it rather than track every change until the next join
+                    del self.map_snapshots[(world_name, binary)]
+
+    def clear_tiles(self, world_name, cx, cy, radius, clearable, circular=True, min_y=0):
+        """Set every clearable tile within radius of (cx, cy) to EMPTY.
+
+        clearable is a 256-entry lookup of the tile values that may be
+        cleared (see EXPLOSION_CLEARABLE). With NumPy the
+        cached mask is applied to each overlapping chunk array in one step;
+        only the tiles that actually change are then recorded, journaled and
+        woken for the falling-block sim.
+
+        Returns the changed tiles as [[x, y, 0], ...]. radius is clamped to
+        MAX_CLEAR_RADIUS.
+        """
+        world = self.worlds.get(world_name)
+        if not world or radius < 0:
+            return []
+        radius = min(radius, MAX_CLEAR_RADIUS)
+        bx0, by0 = max(0, cx - radius), max(0, min_y, cy - radius)
+        bx1, by1 = min(self.mw - 1, cx + radius), min(self.mh - 1, cy + radius)
+        if bx0 > bx1 or by0 > by1:
+            return []
+        mask = tile_mask(radius, circular)
+        changed = []
+        chunks = set()
+        if np is None:
+            for dx, dy in mask:
+                x, y = cx + dx, cy + dy
+                if bx0 <= x <= bx1 and by0 <= y <= by1 and clearable[self.get_tile(world, x, y)]:
+                    chunks.add(self._set_tile(world, x, y, 0))
+                    changed.append([x, y, 0])
+        else:
+            lut = np.frombuffer(clearable, dtype=np.uint8).astype(bool)
+            seed = world['procedural_seed']
+            for ccy in range(by0 // CHUNK_SIZE, by1 // CHUNK_SIZE + 1):
+                for ccx in range(bx0 // CHUNK_SIZE, bx1 // CHUNK_SIZE + 1):
+                    x0, y0 = ccx * CHUNK_SIZE, ccy * CHUNK_SIZE
+                    ax0, ax1 = max(bx0, x0), min(bx1, x0 + CHUNK_SIZE - 1)
+                    ay0, ay1 = max(by0, y0), min(by1, y0 + CHUNK_SIZE - 1)
+                    tiles = np.frombuffer(self._chunk(world, ccx, ccy), dtype=np.uint8).reshape(CHUNK_SIZE, CHUNK_SIZE)
+                    area = tiles[ay0 - y0:ay1 - y0 + 1, ax0 - x0:ax1 - x0 + 1]
+                    hit = mask[ay0 - cy + radius:ay1 - cy + radius + 1,
+                               ax0 - cx + radius:ax1 - cx + radius + 1] & lut[area]
+                    ys, xs = np.nonzero(hit)
+                    if not len(ys):
+                        continue
+                    area[hit] = 0
+                    chunks.add((ccx, ccy))
+                    w, h = ax1 - ax0 + 1, ay1 - ay0 + 1
+                    base = np.frombuffer(procedural_region_bytes(ax0, ay0, w, h, seed, self.mw, self.mh,
+                                                                 vectorized=self.vectorized_terrain),
+                                         dtype=np.uint8).reshape(h, w)
+                    is_base = (base[ys, xs] == 0).tolist()
+                    for y, x, at_base in zip((ys + ay0).tolist(), (xs + ax0).tolist(), is_base):
+                        self._record_tile(world, x, y, 0, at_base)
+                        changed.append([x, y, 0])
+        if not changed:
+            return changed
+
+        if self.journal_enabled:
+            self._journal_write(world_name, b"".join(_JOURNAL_RECORD.pack(x, y, 0) for x, y, _ in changed))
+        for chunk in chunks:
+            self.mark_dirty(world_name, chunk)
+        tops = {}
+        for x, y, _ in changed:
+            if y < tops.get(x, self.mh):
+                tops[x] = y
+        # Falling tiles resting on the cleared area now have nothing below them
+        for x, y in tops.items():
+            if y > 0 and self.get_tile(world, x, y - 1) in FALLING_TILES:
+                self.unstable.setdefault(world_name, set()).add((x, y - 1))
+        return changed
 
     def apply_diff(self, world_name, diffs):
         """Apply a batch of tile updates. diffs is a list of [x, y, value]."""
@@ -445,12 +1587,85 @@ class WorldManager:
         world = self.worlds.get(world_name)
         if not world:
             return []
-        # Filter diffs to the requested area
-        result = []
-        for x, y, val in world.get('diffs', []):
-            if bx <= x < bx + bw and by <= y < by + bh:
-                result.append([x, y, val])
-        return result
+        # Only chunks overlapping the requested area are visited
+        return self._overlay(world).query(bx, by, bw, bh)
+
+    def get_chunk_info(self, world_name):
+        """Get per-chunk diff counts and versions for a world."""
+        world = self.worlds.get(world_name)
+        if not world:
+            return []
+        overlay = self._overlay(world)
+        return [
+            {"cx": cx, "cy": cy, "count": count, "version": version}
+            for (cx, cy), (count, version) in sorted(overlay.chunk_stats().items())
+        ]
+
+    def map_snapshot(self, world_name, binary=False):
+        """Return (frames, patch) for a full map sync.
+
+        frames are the shared pre-encoded map_data frames for the world and
+        patch is the list of [x, y, value] changed since they were built. The
+        snapshot is rebuilt lazily when the patch would be a sizeable share of
+        it, or when the world was reloaded.
+        """
+        world = self.worlds.get(world_name)
+        if not world:
+            return [], []
+        overlay = self._overlay(world)
+        key = (world_name, binary)
+        snapshot = self.map_snapshots.get(key)
+        if (snapshot is None or snapshot.overlay is not overlay
+                or len(snapshot.changed) > snapshot.patch_limit):
+            start = time.perf_counter()
+            snapshot = MapSnapshot(overlay, binary, self.mw)
+            self.map_snapshots[key] = snapshot
+            self.snapshot_stats["builds"] += 1
+            self.snapshot_stats["last_build"] = time.perf_counter() - start
+            print(f"[Map] Built {'binary' if binary else 'JSON'} snapshot of '{world_name}': "
+                  f"{snapshot.count} diffs, {snapshot.size} bytes in "
+                  f"{self.snapshot_stats['last_build'] * 1000:.1f}ms")
+        else:
+            self.snapshot_stats["hits"] += 1
+        if snapshot.version == overlay.version:
+            return snapshot.frames, []
+        return snapshot.frames, [[x, y, self.get_tile(world, x, y)] for x, y in snapshot.changed]
+
+    def get_chunk_manifest(self, world_name):
+        """Get { "cx,cy": content hash } for every chunk of a world with diffs."""
+        world = self.worlds.get(world_name)
+        if not world:
+            return {}
+        return {f"{cx},{cy}": h for (cx, cy), h in self._overlay(world).manifest().items()}
+
+    def get_changed_chunks(self, world_name, client_manifest, chunks=None):
+        """Compare a client's chunk manifest with the world.
+
+        Returns [[cx, cy, hash, diffs], ...] for every chunk whose hash differs,
+        including chunks the client has diffs for that are now pristine (empty
+        hash and diffs). With `chunks`, only those chunks are compared.
+        """
+        world = self.worlds.get(world_name)
+        if not world:
+            return []
+        overlay = self._overlay(world)
+        if chunks is None:
+            chunks = set(overlay.chunks) | set(client_manifest)
+        changed = []
+        for chunk in sorted(chunks):
+            # A chunk missing from the manifest is procedural terrain on the client
+            content_hash = overlay.chunk_hash(chunk)
+            if client_manifest.get(chunk, "") != content_hash:
+                changed.append([chunk[0], chunk[1], content_hash, overlay.chunk_entries(*chunk)])
+        return changed
+
+    def get_chunk_diffs(self, world_name, cx, cy):
+        """Get (content hash, diffs) for one chunk."""
+        world = self.worlds.get(world_name)
+        if not world:
+            return "", []
+        overlay = self._overlay(world)
+        return overlay.chunk_hash((cx, cy)), overlay.chunk_entries(cx, cy)
 
     def get_all_diffs(self, world_name):
         """Get all diffs for full map sync."""
@@ -473,48 +1688,696 @@ class WorldManager:
         if not world_obj:
             print(f"[Save] World '{world_name}' not found")
             return False
-        
-        world_obj['last_save'] = time.time()
-        path = self._world_path(world_name)
+
+        start = time.perf_counter()
+        snapshot = self._snapshot(world_name, world_obj)
         try:
-            self._ensure_directory()
-            diffs_count = len(world_obj.get('diffs', []))
-            players_count = len(world_obj.get('player_data', {}))
-            print(f"[Save] Saving world '{world_name}' to {path} ({diffs_count} diffs, {players_count} players)")
-            with open(path, 'w') as f:
-                json.dump(world_obj, f, indent=2)
-            print(f"[Save] Successfully saved world '{world_name}'")
-            return True
+            records = self._write_snapshot(snapshot)
         except Exception as e:
-            print(f"[Save] Error saving world '{world_name}': {e}")
+            self._save_failed(world_name, e)
             return False
+        self._save_done(snapshot, records, start, time.perf_counter() - start)
+        return True
+
+    async def save_world_async(self, world_name, world_obj=None):
+        """Save a world without blocking the event loop.
+
+        A snapshot is taken on the loop (copying only the chunks changed since
+        the last save), then encoding and file I/O run in a worker thread.
+        Returns False if the world is missing, already being saved, or the
+        write failed; the world then stays dirty and is retried later.
+        """
+        if world_obj is None:
+            world_obj = self.worlds.get(world_name)
+        if not world_obj:
+            print(f"[Save] World '{world_name}' not found")
+            return False
+        if world_name in self.saving:
+            self.save_stats["skipped"] += 1
+            return False
+
+        start = time.perf_counter()
+        snapshot = self._snapshot(world_name, world_obj)
+        snapshot_time = time.perf_counter() - start
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.save_executor, self._write_snapshot, snapshot)
+        self.saving[world_name] = future
+        try:
+            records = await future
+        except Exception as e:
+            self._save_failed(world_name, e)
+            return False
+        finally:
+            self.saving.pop(world_name, None)
+        self._save_done(snapshot, records, start, snapshot_time)
+        return True
+
+    async def wait_for_saves(self):
+        """Wait for any in-flight background saves to finish."""
+        if self.saving:
+            await asyncio.gather(*self.saving.values(), return_exceptions=True)
+
+    def _snapshot(self, world_name, world_obj):
+        """Capture a consistent copy of what needs writing. Runs on the event loop."""
+        world_obj['last_save'] = time.time()
+        overlay = self._overlay(world_obj)
+        # Changes after this point go to a fresh journal
+        self._rotate_journal(world_name)
+        self.dirty_since.pop(world_name, None)
+        dirty = self.dirty_chunks.pop(world_name, set())
+        records = self.chunk_records.get(world_name)
+        if records is None:
+            records = {}
+            dirty = set(overlay.chunks)
+        meta = {k: v for k, v in world_obj.items() if k not in ('diffs', 'player_data')}
+        players_count = len(world_obj.get('player_data', {}))
+        print(f"[Save] Saving world '{world_name}' to {self._binary_path(world_name)} "
+              f"({len(overlay)} diffs, {players_count} players)")
+        return {
+            "world_name": world_name,
+            "rotated_journal": self._journal_path(world_name, rotated=True),
+            "path": self._binary_path(world_name),
+            "players_path": self._players_path(world_name),
+            "meta": json.loads(json.dumps(meta)),
+            "players_json": json.dumps(world_obj.get('player_data', {}), separators=(',', ':')),
+            "records": dict(records),
+            "changed": {chunk: [tuple(e) for e in overlay.chunks.get(chunk, {}).values()]
+                        for chunk in dirty}
+        }
+
+    def _write_snapshot(self, snapshot):
+        """Encode changed chunks and write the world files. Safe to run off the loop."""
+        self._ensure_directory()
+        records = snapshot["records"]
+        for chunk, entries in snapshot["changed"].items():
+            if entries:
+                records[chunk] = encode_chunk_diffs(chunk[0], chunk[1], entries)
+            else:
+                records.pop(chunk, None)
+        atomic_write(snapshot["path"], encode_world_binary(snapshot["meta"], list(records.values())))
+        atomic_write(snapshot["players_path"], snapshot["players_json"], 'w')
+        # The snapshot now covers everything in the rotated journal
+        if os.path.exists(snapshot["rotated_journal"]):
+            os.remove(snapshot["rotated_journal"])
+        return records
+
+    def _save_done(self, snapshot, records, start, loop_time):
+        world_name = snapshot["world_name"]
+        duration = time.perf_counter() - start
+        self.chunk_records[world_name] = records
+        stats = self.save_stats
+        stats["count"] += 1
+        stats["total_duration"] += duration
+        stats["last_duration"] = duration
+        stats["max_duration"] = max(stats["max_duration"], duration)
+        stats["last_loop_time"] = loop_time
+        print(f"[Save] Successfully saved world '{world_name}' in {duration * 1000:.1f}ms "
+              f"({loop_time * 1000:.1f}ms on event loop)")
+
+    def _save_failed(self, world_name, error):
+        print(f"[Save] Error saving world '{world_name}': {error}")
+        self.save_stats["failures"] += 1
+        # Keep the world dirty and re-encode every chunk on the next attempt
+        self.chunk_records.pop(world_name, None)
+        self.mark_dirty(world_name)
+
+    def _due_worlds(self, force):
+        now = time.time()
+        due = [world_name for world_name, since in list(self.dirty_since.items())
+               if force or now - since >= self.save_max_delay]
+        # Compact journals that have grown past their size or age limit
+        due.extend(world_name for world_name in list(self.journals)
+                   if world_name not in due and self._journal_due(world_name, now))
+        return due
+
+    async def flush_dirty_async(self, force=False):
+        """Save worlds whose oldest unsaved change is older than save_max_delay.
+
+        Encoding and writing happen off the event loop. With force=True every
+        dirty world is saved. Returns the number saved.
+        """
+        saved = 0
+        for world_name in self._due_worlds(force):
+            if await self.save_world_async(world_name):
+                saved += 1
+        return saved
 
     def save_all(self):
         """Save all loaded worlds."""
         for world_name in list(self.worlds.keys()):
             self.save_world(world_name)
 
+    def close(self):
+        """Close open journal files (after a final save_all)."""
+        for world_name in list(self.journals):
+            self._close_journal(world_name)
+
+
+# ============================================================================
+# BINARY WIRE PROTOCOL
+# ============================================================================
+#
+# Clients that send "proto": "bin1" in their join message receive move, tile,
+# explode and map_data messages as binary frames (everything else stays JSON).
+# A binary frame is a sequence of little-endian records, each starting with a
+# u8 record type:
+#
+#   MOVE     u16 netId | f32 sx | f32 sy | f32 tx | f32 ty | i16 gx | i16 gy
+#            | f32 r | u8 flags (1=drill, 2=isAdmin) | u32 color (0xRRGGBB,
+#            0xFFFFFFFF = unknown); missing tx/ty are NaN
+#   TILE     u16 x | u16 y | u8 val
+#   EXPLODE  u16 netId (0 = server) | i16 x | i16 y | u16 r | u32 t
+#   MAP      u32 n | u8 more | f64 worldTime (0 = none) | n x u16 x
+#            | n x u16 y | n x u8 val
+#   TILES    u32 n | n x u16 x | n x u16 y | n x u8 val (a "tiles" batch)
+#   MAPRUNS  u32 n | u16 width | u32 size | size bytes of runs, each
+#            varint gap | varint length | u8 val, over tile index y*width+x
+#            sorted ascending (gap counts from the end of the previous run);
+#            decodes to map_data with more=true
+#
+# netId is a per-room u16 handle sent as "netId" in join_result.players and
+# join messages, so long fields (id, username, joinedAt) are not repeated.
+# Binary clients may send MOVE and TILE records; they are handled like move
+# and tile_update messages.
+
+BINARY_PROTOCOL = "bin1"
+BIN_MOVE = 1
+BIN_TILE = 2
+BIN_EXPLODE = 3
+BIN_MAP = 4
+BIN_MAP_RUNS = 5
+BIN_TILES = 6
+_BIN_MOVE = struct.Struct("<BHffffhhfBI")
+_BIN_TILE = struct.Struct("<BHHB")
+_BIN_EXPLODE = struct.Struct("<BHhhHI")
+_BIN_MAP = struct.Struct("<BIBd")
+_BIN_MAP_RUNS = struct.Struct("<BIHI")
+_BIN_TILES = struct.Struct("<BI")
+_NO_COLOR = 0xFFFFFFFF
+
+
+def _color_to_int(col):
+    if isinstance(col, str) and len(col) == 7 and col[0] == '#':
+        try:
+            return int(col[1:], 16)
+        except ValueError:
+            pass
+    return _NO_COLOR
+
+
+def _float_or_nan(value):
+    return float(value) if isinstance(value, (int, float)) else float('nan')
+
+
+def encode_binary_message(data, net_ids):
+    """Encode a move/tile/explode message as a binary record.
+
+    Returns None for message types (or field values) with no binary form, in
+    which case the caller should fall back to JSON.
+    """
+    msg_type = data.get("type")
+    try:
+        if msg_type == "move":
+            flags = (1 if data.get("drill") else 0) | (2 if data.get("isAdmin") else 0)
+            return _BIN_MOVE.pack(BIN_MOVE, net_ids.get(data.get("id"), 0),
+                                  _float_or_nan(data.get("sx")), _float_or_nan(data.get("sy")),
+                                  _float_or_nan(data.get("tx")), _float_or_nan(data.get("ty")),
+                                  int(data.get("gx")), int(data.get("gy")),
+                                  _float_or_nan(data.get("r")), flags, _color_to_int(data.get("col")))
+        if msg_type == "tile":
+            return _BIN_TILE.pack(BIN_TILE, data["x"], data["y"], data["val"])
+        if msg_type == "tiles":
+            return _BIN_TILES.pack(BIN_TILES, len(data["diffs"])) + _pack_diffs(data["diffs"])
+        if msg_type == "explode":
+            return _BIN_EXPLODE.pack(BIN_EXPLODE, net_ids.get(data.get("id"), 0),
+                                     data["x"], data["y"], data["r"], data["t"])
+    except (struct.error, TypeError, ValueError, KeyError, OverflowError):
+        return None
+    return None
+
+
+def _pack_diffs(diffs):
+    """Pack [x, y, val] triples as x[], y[], val[] column arrays."""
+    xs = array('H')
+    ys = array('H')
+    vals = bytearray()
+    for x, y, val in diffs:
+        xs.append(x)
+        ys.append(y)
+        vals.append(val)
+    return _le_bytes(xs) + _le_bytes(ys) + bytes(vals)
+
+
+def encode_map_binary(diffs, more, world_time=None):
+    """Encode a map_data message as a packed binary record."""
+    header = _BIN_MAP.pack(BIN_MAP, len(diffs), 1 if more else 0, float(world_time or 0))
+    return header + _pack_diffs(diffs)
+
+
+def _put_varint(out, value):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def encode_map_runs(diffs, width):
+    """Encode diffs as a MAPRUNS record of same-valued runs along each row.
+
+    Mined tunnels are mostly horizontal runs of one value, so this is far
+    smaller than one x/y/val triple per diff.
+    """
+    cells = sorted((y * width + x, val) for x, y, val in diffs)
+    out = bytearray()
+    prev_end = 0
+    i = 0
+    while i < len(cells):
+        start, val = cells[i]
+        j = i + 1
+        while j < len(cells) and cells[j][0] == start + (j - i) and cells[j][1] == val:
+            j += 1
+        _put_varint(out, start - prev_end)
+        _put_varint(out, j - i)
+        out.append(val)
+        prev_end = start + (j - i)
+        i = j
+    return _BIN_MAP_RUNS.pack(BIN_MAP_RUNS, len(cells), width, len(out)) + bytes(out)
+
+
+class MapSnapshot:
+    """Pre-encoded map_data frames for a world, shared by every joiner.
+
+    Built from the world's diffs at one overlay version. Tiles changed after
+    that are collected in ``changed`` and sent as a small patch on top, so a
+    join storm costs one encode instead of one per player. WorldManager
+    rebuilds the snapshot once the patch grows past a fraction of its size.
+    """
+
+    JSON_CHUNK = 10000  # diffs per JSON map_data frame
+
+    def __init__(self, overlay, binary, width):
+        self.overlay = overlay
+        self.version = overlay.version
+        self.count = len(overlay.diffs)
+        self.changed = set()  # (x, y) changed since the snapshot was built
+        self.patch_limit = max(1000, self.count // 10)  # Past this many changes it is rebuilt
+        if binary:
+            self.frames = [encode_map_runs(overlay.diffs, width)] if overlay.diffs else []
+        else:
+            self.frames = [
+                json.dumps({"type": "map_data", "diffs": overlay.diffs[i:i + self.JSON_CHUNK], "more": True})
+                for i in range(0, len(overlay.diffs), self.JSON_CHUNK)
+            ]
+        self.size = sum(len(frame) for frame in self.frames)
+
+
+def decode_binary_messages(payload):
+    """Decode client binary records into the equivalent JSON-style messages."""
+    messages = []
+    offset = 0
+    while offset < len(payload):
+        record_type = payload[offset]
+        if record_type == BIN_MOVE and offset + _BIN_MOVE.size <= len(payload):
+            _, _, sx, sy, tx, ty, gx, gy, r, flags, color = _BIN_MOVE.unpack_from(payload, offset)
+            offset += _BIN_MOVE.size
+            message = {
+                "type": "move", "sx": sx, "sy": sy,
+                "tx": None if math.isnan(tx) else tx, "ty": None if math.isnan(ty) else ty,
+                "gx": gx, "gy": gy, "r": r, "drill": bool(flags & 1)
+            }
+            if color != _NO_COLOR:
+                message["col"] = f"#{color & 0xFFFFFF:06x}"
+            messages.append(message)
+        elif record_type == BIN_TILE and offset + _BIN_TILE.size <= len(payload):
+            _, x, y, val = _BIN_TILE.unpack_from(payload, offset)
+            offset += _BIN_TILE.size
+            messages.append({"type": "tile_update", "x": x, "y": y, "val": val})
+        else:
+            break  # Unknown or truncated record - drop the rest of the frame
+    return messages
+
 
 # ============================================================================
 # ROOM / CHANNEL MANAGER
 # ============================================================================
 
+class InterestGrid:
+    """Uniform grid index of player positions for area-of-interest queries.
+
+    Cells are `radius` tiles wide, so everyone within `radius` of a point is
+    found by checking the 3x3 block of cells around it.
+    """
+
+    def __init__(self, radius):
+        self.radius = max(1, radius)
+        self.cells = {}  # (cx, cy) -> set of usernames
+        self.positions = {}  # username -> (gx, gy)
+
+    def cell_of(self, gx, gy):
+        return int(gx) // self.radius, int(gy) // self.radius
+
+    def update(self, username, gx, gy):
+        """Record a player's position. Returns True if they changed cell."""
+        old = self.positions.get(username)
+        new_cell = self.cell_of(gx, gy)
+        self.positions[username] = (gx, gy)
+        if old is not None:
+            old_cell = self.cell_of(*old)
+            if old_cell == new_cell:
+                return False
+            members = self.cells.get(old_cell)
+            if members is not None:
+                members.discard(username)
+                if not members:
+                    del self.cells[old_cell]
+        self.cells.setdefault(new_cell, set()).add(username)
+        return True
+
+    def remove(self, username):
+        pos = self.positions.pop(username, None)
+        if pos is None:
+            return
+        cell = self.cell_of(*pos)
+        members = self.cells.get(cell)
+        if members is not None:
+            members.discard(username)
+            if not members:
+                del self.cells[cell]
+
+    def query(self, x, y, reach=0):
+        """Usernames whose interest square covers (x, y), widened by reach tiles."""
+        limit = self.radius + reach
+        span = 1 + reach // self.radius
+        cx, cy = self.cell_of(x, y)
+        found = set()
+        for ny in range(cy - span, cy + span + 1):
+            for nx in range(cx - span, cx + span + 1):
+                for username in self.cells.get((nx, ny), ()):
+                    px, py = self.positions[username]
+                    if abs(px - x) <= limit and abs(py - y) <= limit:
+                        found.add(username)
+        return found
+
+
+class TimerHeap:
+    """Per-room heap of timers keyed by due time.
+
+    Only the earliest timer has a loop.call_at callback armed, so timers fire
+    on time without polling and a room with nothing pending costs nothing.
+    Callbacks are coroutine functions, started as tasks when they fall due.
+    """
+
+    def __init__(self):
+        self.heap = []  # (due loop time, sequence, coroutine function, args)
+        self.handle = None
+        self.armed_at = None
+        self.tasks = set()  # Running callbacks; the loop only keeps weak references
+        self._seq = 0
+        self.stats = {"scheduled": 0, "fired": 0, "cancelled": 0, "failed": 0,
+                      "last_lag": 0.0, "max_lag": 0.0, "total_lag": 0.0}
+
+    @property
+    def pending(self):
+        return len(self.heap)
+
+    def schedule(self, delay, callback, *args):
+        """Run callback(*args) as a task `delay` seconds from now."""
+        loop = asyncio.get_running_loop()
+        self._seq += 1
+        heapq.heappush(self.heap, (loop.time() + max(0.0, delay), self._seq, callback, args))
+        self.stats["scheduled"] += 1
+        self._arm(loop)
+
+    def _arm(self, loop):
+        if not self.heap:
+            return
+        due = self.heap[0][0]
+        if self.handle is not None:
+            if self.armed_at == due:
+                return
+            self.handle.cancel()
+        self.handle = loop.call_at(due, self._fire)
+        self.armed_at = due
+
+    def _fire(self):
+        loop = asyncio.get_running_loop()
+        self.handle = None
+        self.armed_at = None
+        now = loop.time()
+        while self.heap and self.heap[0][0] <= now:
+            due, _, callback, args = heapq.heappop(self.heap)
+            lag = now - due
+            self.stats["fired"] += 1
+            self.stats["last_lag"] = lag
+            self.stats["total_lag"] += lag
+            self.stats["max_lag"] = max(self.stats["max_lag"], lag)
+            task = loop.create_task(callback(*args))
+            self.tasks.add(task)
+            task.add_done_callback(self._task_done)
+        self._arm(loop)
+
+    def _task_done(self, task):
+        self.tasks.discard(task)
+        if task.cancelled():
+            return
+        error = task.exception()
+        if error is not None:
+            self.stats["failed"] += 1
+            print(f"[Timer] Callback failed: {error!r}")
+
+    def cancel_all(self):
+        if self.handle is not None:
+            self.handle.cancel()
+            self.handle = None
+            self.armed_at = None
+        self.stats["cancelled"] += len(self.heap)
+        self.heap.clear()
+
+
 class Room:
     """A game room containing connected players and world state."""
 
-    def __init__(self, room_id, world_manager, config):
-        self.room_id = room_id
-        self.world = world_manager.load_world(room_id)
-        self.world_manager = world_manager
-        self.config = config
-        self.players = {}  # username -> PlayerState
-        self.admin = None  # username of admin (first to join)
-        self.last_activity = time.time()
-        self.next_autosave = time.time() + config['server']['autosave_interval']
+    def __init__(self, room_id, world_manager, config):
+        self.room_id = room_id
+        self.world = world_manager.load_world(room_id)
+        self.world_manager = world_manager
+        self.config = config
+        self.players = {}  # username -> PlayerState
+        self.admin = None  # username of admin (first to join)
+        self.last_activity = time.time()
+        self.next_autosave = time.time() + config['server']['autosave_interval']
+        self.pending_moves = {}  # username -> latest move packet this tick
+        self.last_moves = {}  # username -> most recent move packet sent
+        self.batch_queue = []  # (json text, binary or None, excluded username, recipients or None)
+        self.net_ids = {}  # player_id -> u16 handle used by the binary protocol
+        self._next_net_id = 1
+        perf = config.get('performance', {})
+        self.interest = InterestGrid(perf.get('interest_radius', DEFAULT_CONFIG['performance']['interest_radius']))
+        self.chunk_subscribers = {}  # (cx, cy) -> usernames of streaming players subscribed to it
+        self.timers = TimerHeap()  # Explosive detonations and other timed events
+        self.sim_task = None  # Fixed-timestep simulation task (MegaMinerServer._room_sim_loop)
+        self.sim_stats = {"ticks": 0, "overruns": 0, "late_ticks": 0, "skipped_ticks": 0,
+                          "last_duration": 0.0, "max_duration": 0.0, "max_lateness": 0.0,
+                          "phases": {}}  # phase -> {"count", "last", "max", "total"} seconds
+
+    @property
+    def player_count(self):
+        return len(self.players)
+
+    def record_phase(self, phase, seconds):
+        """Accumulate the time spent in one simulation phase."""
+        stats = self.sim_stats["phases"].setdefault(phase, {"count": 0, "last": 0.0, "max": 0.0, "total": 0.0})
+        stats["count"] += 1
+        stats["last"] = seconds
+        stats["total"] += seconds
+        if seconds > stats["max"]:
+            stats["max"] = seconds
+
+    def assign_net_id(self, player):
+        """Give a player a free u16 handle for the binary protocol (0 is the server)."""
+        used = set(self.net_ids.values())
+        while self._next_net_id in used or self._next_net_id == 0:
+            self._next_net_id = (self._next_net_id + 1) & 0xFFFF
+        player.net_id = self._next_net_id
+        self.net_ids[player.player_id] = player.net_id
+        self._next_net_id = (self._next_net_id + 1) & 0xFFFF
+
+    @property
+    def has_binary_clients(self):
+        return any(p.binary_proto for p in self.players.values())
+
+    def set_subscriptions(self, player, chunks):
+        """Replace a streaming player's chunk subscriptions.
+
+        Returns (added, dropped) chunk lists.
+        """
+        added = [chunk for chunk in chunks if chunk not in player.subscriptions]
+        dropped = [chunk for chunk in player.subscriptions if chunk not in chunks]
+        for chunk in dropped:
+            members = self.chunk_subscribers.get(chunk)
+            if members is not None:
+                members.discard(player.username)
+                if not members:
+                    del self.chunk_subscribers[chunk]
+        for chunk in added:
+            self.chunk_subscribers.setdefault(chunk, set()).add(player.username)
+        player.subscriptions = set(chunks)
+        return added, dropped
+
+    def audience(self, x, y, reach=0):
+        """Usernames that should see a change at (x, y) reaching `reach` tiles.
+
+        Streaming players get it if they subscribe to an affected chunk, the
+        rest if they are within interest range.
+        """
+        found = set()
+        for username in self.interest.query(x, y, reach):
+            player = self.players.get(username)
+            if player is not None and not player.streaming:
+                found.add(username)
+        if self.chunk_subscribers:
+            cx0, cy0 = chunk_of(int(x) - reach, int(y) - reach)
+            cx1, cy1 = chunk_of(int(x) + reach, int(y) + reach)
+            for cy in range(cy0, cy1 + 1):
+                for cx in range(cx0, cx1 + 1):
+                    found.update(self.chunk_subscribers.get((cx, cy), ()))
+        return found
+
+    def remove_player(self, username):
+        """Drop a player and any per-player routing state."""
+        player = self.players.pop(username, None)
+        if player is not None and self.net_ids.get(player.player_id) == player.net_id:
+            del self.net_ids[player.player_id]
+        if player is not None and player.subscriptions:
+            self.set_subscriptions(player, set())
+        self.pending_moves.pop(username, None)
+        self.last_moves.pop(username, None)
+        self.interest.remove(username)
+
+
+class SendQueue:
+    """Bounded outbound frame queue for one connection.
+
+    push() never blocks: frames are appended and a writer task sends them in
+    order. Droppable frames (moves, superseded by the next update) are
+    discarded oldest-first once the queue is over its limit; all other frames
+    are always delivered. A client that stays over the limit for
+    slow_timeout seconds, or reaches four times the limit, is disconnected.
+    """
+
+    _CLOSE = object()  # Sentinel: close the connection once queued frames are sent
+
+    def __init__(self, websocket, limit=256, slow_timeout=10.0, stats=None):
+        self.websocket = websocket
+        self.limit = max(1, limit)
+        self.hard_limit = self.limit * 4
+        self.slow_timeout = slow_timeout
+        self.stats = stats if stats is not None else {}
+        self.frames = deque()  # (frame, droppable)
+        self.droppable = 0  # Number of droppable frames in the queue
+        self.over_since = None  # Monotonic time the queue went over its limit
+        self.closing = False
+        self._wakeup = asyncio.Event()
+        self.task = asyncio.create_task(self._writer())
+
+    def __len__(self):
+        return len(self.frames)
+
+    def push(self, frame, droppable=False):
+        """Queue a frame. Returns False if the connection is closing."""
+        if self.closing:
+            return False
+        self.frames.append((frame, droppable))
+        if droppable:
+            self.droppable += 1
+        depth = len(self.frames)
+        if depth > self.limit:
+            while self.droppable and len(self.frames) > self.limit:
+                self._drop_oldest()
+            depth = len(self.frames)
+        if depth > self.limit:
+            now = time.monotonic()
+            if self.over_since is None:
+                self.over_since = now
+            if depth >= self.hard_limit or now - self.over_since > self.slow_timeout:
+                self._disconnect_slow(depth)
+                return False
+        if depth > self.stats.get("max_depth", 0):
+            self.stats["max_depth"] = depth
+        self._wakeup.set()
+        return True
+
+    def _drop_oldest(self):
+        for i, (frame, droppable) in enumerate(self.frames):
+            if droppable:
+                del self.frames[i]
+                self.droppable -= 1
+                self.stats["dropped"] = self.stats.get("dropped", 0) + 1
+                return
+
+    def _disconnect_slow(self, depth):
+        self.stats["slow_disconnects"] = self.stats.get("slow_disconnects", 0) + 1
+        print(f"[Send] Disconnecting slow client {self.websocket.remote_address} ({depth} frames queued)")
+        self.frames.clear()
+        self.droppable = 0
+        self.closing = True
+        self.task.cancel()
+        # The close replaces the writer as the queue's task, so it stays
+        # referenced and close()/stop() see it
+        self.task = asyncio.create_task(self._close(1008, "Client too slow"))
+
+    async def _close(self, code=1000, reason=""):
+        try:
+            await self.websocket.close(code, reason)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        except Exception as e:
+            print(f"[Send] Error closing {self.websocket.remote_address}: {e}")
+
+    def close(self, code=1000, reason=""):
+        """Close the connection after the frames already queued are sent.
 
-    @property
-    def player_count(self):
-        return len(self.players)
+        Returns the writer task, which finishes once the socket is closed.
+        """
+        if not self.closing:
+            self.closing = True
+            self.frames.append((self._CLOSE, (code, reason)))
+            self._wakeup.set()
+        return self.task
+
+    def stop(self):
+        """Discard queued frames and stop the writer (connection is gone)."""
+        self.closing = True
+        self.frames.clear()
+        self.droppable = 0
+        self.task.cancel()
+
+    async def _writer(self):
+        frames = self.frames
+        try:
+            while True:
+                if not frames:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+                frame, droppable = frames.popleft()
+                if frame is self._CLOSE:
+                    await self._close(*droppable)
+                    return
+                if droppable:
+                    self.droppable -= 1
+                if len(frames) <= self.limit:
+                    self.over_since = None
+                await self.websocket.send(frame)
+                self.stats["sent"] = self.stats.get("sent", 0) + 1
+                # Text frames go out UTF-8 encoded; JSON is almost always ASCII
+                size = len(frame) if isinstance(frame, bytes) or frame.isascii() else len(frame.encode('utf-8'))
+                self.stats["bytes"] = self.stats.get("bytes", 0) + size
+        except Exception:
+            # Connection closed or broken - the handler cleans up
+            self.closing = True
+            frames.clear()
+            self.droppable = 0
 
 
 class PlayerState:
@@ -522,8 +2385,16 @@ class PlayerState:
 
     def __init__(self, websocket, username, account_token=None):
         self.websocket = websocket
+        self.outbox = None  # SendQueue drained by the connection's writer task
         self.username = username
         self.account_token = account_token
+        self.supports_batch = False  # Client opted into "batch" frames at join
+        self.binary_proto = False  # Client negotiated the binary wire protocol at join
+        self.chunk_sync = False  # Client keeps chunk hashes and resyncs with sync_manifest
+        self.streaming = False  # Client subscribes to chunks instead of getting the whole map
+        self.subscriptions = set()  # (cx, cy) chunks this player is subscribed to
+        self.known_hashes = {}  # (cx, cy) -> hash of the copy held for an unsubscribed chunk
+        self.net_id = 0
         self.player_id = str(uuid.uuid4())
         self.joined_at = time.time()
         self.last_heartbeat = time.time()
@@ -557,6 +2428,7 @@ class PlayerState:
     def to_dict(self):
         return {
             "id": self.player_id,
+            "netId": self.net_id,
             "username": self.username,
             "color": self.color,
             "joinedAt": int(self.joined_at * 1000),
@@ -601,41 +2473,28 @@ class DummyClient:
         self.username = "__SERVER__"
         self.joined_at = time.time()
         self.last_heartbeat = time.time()
-        self.explosives = []  # Track active TNT/Nuke timers
         self.last_random_event = 0
         
-    async def update(self, room_id):
-        """Called periodically to handle server-side game logic."""
-        room = self.server.rooms.get(room_id)
-        if not room:
-            return
-            
+    async def tick(self, room):
+        """Run one simulation tick of server-side game logic for a room.
+
+        Called at a fixed rate by the room's simulation task; the time spent
+        in each phase is recorded in room.sim_stats.
+        """
         now_time = time.time() * 1000  # ms
         
-        # 1. Handle explosive timers
-        for i in range(len(self.explosives) - 1, -1, -1):
-            e = self.explosives[i]
-            if not e.get('sent'):
-                # Broadcast explosion to all players
-                await self.server.broadcast_to_room(room_id, {
-                    "type": "explode",
-                    "id": self.player_id,
-                    "x": e['x'],
-                    "y": e['y'],
-                    "r": e['range'],
-                    "t": e['timer']
-                })
-                e['sent'] = True
-                e['done_at'] = now_time + e['timer']
-            if now_time >= e.get('done_at', 0):
-                # Apply explosion to world
-                self._apply_explosion(room, e['x'], e['y'], e['range'])
-                self.explosives.pop(i)
-        
-        # 2. Handle falling blocks (Gravel/Sand) near players
+        # 1. Handle falling blocks (Gravel/Sand) near players
+        # (explosives run on the room's timer heap, see add_explosive)
+        start = time.perf_counter()
         await self._update_falling_blocks(room)
+        room.record_phase("falling_blocks", time.perf_counter() - start)
         
-        # 3. Random events (every ~30 seconds)
+        # 2. Random events (every ~30 seconds)
+        start = time.perf_counter()
+        await self._maybe_random_event(room, now_time)
+        room.record_phase("events", time.perf_counter() - start)
+
+    async def _maybe_random_event(self, room, now_time):
         if now_time - self.last_random_event > 30000:
             self.last_random_event = now_time
             # Only trigger if there are players underground
@@ -644,71 +2503,91 @@ class DummyClient:
                     await self._trigger_random_event(room)
                     break
     
-    def add_explosive(self, x, y, range_val, timer):
-        """Register an explosive placed by a player."""
-        self.explosives.append({
-            'x': x, 'y': y, 'range': range_val, 'timer': timer,
-            'sent': False, 'placed_at': time.time() * 1000
-        })
+    async def add_explosive(self, room_id, x, y, range_val, timer):
+        """Register an explosive placed by a player.
+
+        Announces it to the room, then detonates it on the room's timer heap
+        exactly `timer` ms later.
+        """
+        room = self.server.rooms.get(room_id)
+        if not room or not isinstance(timer, (int, float)):
+            return
+        # Broadcast explosion to all players
+        await self.server.broadcast_to_room(room_id, {
+            "type": "explode",
+            "id": self.player_id,
+            "x": x,
+            "y": y,
+            "r": range_val,
+            "t": timer
+        }, near=(x, y), reach=range_val if isinstance(range_val, int) else 0)
+        room.timers.schedule(timer / 1000, self._detonate, room_id, x, y, range_val)
+
+    async def _detonate(self, room_id, x, y, range_val):
+        room = self.server.rooms.get(room_id)
+        if room:
+            # Apply explosion to world
+            start = time.perf_counter()
+            await self._apply_explosion(room, x, y, range_val)
+            room.record_phase("explosives", time.perf_counter() - start)
     
-    def _apply_explosion(self, room, cx, cy, radius):
-        """Apply explosion effects to the world."""
-        mw = DEFAULT_CONFIG['game']['map_width']
-        mh = DEFAULT_CONFIG['game']['map_height']
-        wm = self.server.worlds
-        need_save = False
-        
-        for y in range(cy - radius, cy + radius + 1):
-            for x in range(cx - radius, cx + radius + 1):
-                if y > 4 and 0 <= x < mw and 0 <= y < mh:
-                    if math.sqrt((x - cx)**2 + (y - cy)**2) <= radius:
-                        tile = wm.get_tile(room.world, x, y)
-                        if tile != 99:  # Not bedrock
-                            wm.update_tile(room.room_id, x, y, 0)  # EMPTY
-                            need_save = True
-        
-        # Save world after explosion changes
-        if need_save:
-            wm.save_world(room.room_id, room.world)
+    async def _apply_explosion(self, room, cx, cy, radius):
+        """Apply explosion effects to the world and send the cleared tiles."""
+        if not all(isinstance(v, int) for v in (cx, cy, radius)):
+            return
+        # Everything but bedrock below the surface rows; changed tiles are
+        # marked dirty and saved by the write-behind flush
+        changed = self.server.worlds.clear_tiles(room.room_id, cx, cy, radius, EXPLOSION_CLEARABLE,
+                                                 circular=True, min_y=5)
+        if changed:
+            await self.server.queue_to_room(room.room_id, {
+                "type": "tiles", "diffs": changed
+            }, near=(cx, cy), reach=radius)
     
     async def _update_falling_blocks(self, room):
-        """Update falling blocks (Gravel/Sand) near all players."""
+        """Drop each woken Gravel/Sand tile onto the first solid tile below it.
+
+        Only tiles woken by a tile change (see WorldManager.update_tile), plus
+        unstable tiles in chunks near players, are checked, so the cost is
+        proportional to the blocks actually falling. A block settles in the
+        tick it is woken; the tile above it is woken by the move and falls on
+        the next tick. All changes of a tick are queued together.
+        """
         mw = DEFAULT_CONFIG['game']['map_width']
         mh = DEFAULT_CONFIG['game']['map_height']
         wm = self.server.worlds
-        falling_types = {23, 24}  # GRAVEL, SAND
-        need_save = False
-        
-        for username, player in room.players.items():
-            check_radius = 15
-            start_col = max(0, player.grid_x - check_radius)
-            end_col = min(mw - 1, player.grid_x + check_radius)
-            start_row = max(0, player.grid_y - check_radius)
-            end_row = min(mh - 1, player.grid_y + check_radius)
-            
-            for y in range(start_row, end_row + 1):
-                for x in range(start_col, end_col + 1):
-                    tile = wm.get_tile(room.world, x, y)
-                    if tile not in falling_types:
-                        continue
-                    if y >= mh - 1:
-                        continue
-                    below = wm.get_tile(room.world, x, y + 1)
-                    if below == 0:  # EMPTY
-                        wm.update_tile(room.room_id, x, y, 0)
-                        wm.update_tile(room.room_id, x, y + 1, tile)
-                        need_save = True
-                        # Broadcast tile updates
-                        await self.server.broadcast_to_room(room.room_id, {
-                            "type": "tile", "x": x, "y": y, "val": 0
-                        })
-                        await self.server.broadcast_to_room(room.room_id, {
-                            "type": "tile", "x": x, "y": y + 1, "val": tile
-                        })
-        
-        # Save world after falling block changes
-        if need_save:
-            wm.save_world(room.room_id, room.world)
+        check_radius = 15
+
+        for player in room.players.values():
+            if not isinstance(player.grid_x, (int, float)) or not isinstance(player.grid_y, (int, float)):
+                continue
+            gx, gy = int(player.grid_x), int(player.grid_y)
+            cx0, cy0 = chunk_of(max(0, gx - check_radius), max(0, gy - check_radius))
+            cx1, cy1 = chunk_of(min(mw - 1, gx + check_radius), min(mh - 1, gy + check_radius))
+            for cy in range(cy0, cy1 + 1):
+                for cx in range(cx0, cx1 + 1):
+                    wm.scan_unstable(room.room_id, cx, cy)
+
+        changes = {}
+        # Top to bottom, as the per-player scan used to do
+        for x, y in sorted(wm.take_unstable(room.room_id), key=lambda pos: pos[1]):
+            if y >= mh - 1:
+                continue
+            tile = wm.get_tile(room.world, x, y)
+            if tile not in FALLING_TILES or wm.get_tile(room.world, x, y + 1) != 0:
+                continue
+            land = y + 1
+            while land < mh - 1 and wm.get_tile(room.world, x, land + 1) == 0:
+                land += 1
+            wm.update_tile(room.room_id, x, y, 0)
+            wm.update_tile(room.room_id, x, land, tile)
+            changes[(x, y)] = 0
+            changes[(x, land)] = tile
+
+        for (x, y), val in changes.items():
+            await self.server.queue_to_room(room.room_id, {
+                "type": "tile", "x": x, "y": y, "val": val
+            }, near=(x, y))
     
     async def _trigger_random_event(self, room):
         """Trigger a random event near a random player."""
@@ -753,7 +2632,6 @@ class DummyClient:
         wm = self.server.worlds
         mw = DEFAULT_CONFIG['game']['map_width']
         mh = DEFAULT_CONFIG['game']['map_height']
-        need_save = False
         
         if event_id == 'cave_in':
             radius = 2 + random.randint(0, 1)
@@ -766,10 +2644,9 @@ class DummyClient:
                             tile = wm.get_tile(room.world, cx, cy)
                             if tile not in (0, 99):
                                 wm.update_tile(room.room_id, cx, cy, 0)
-                                need_save = True
-                                await self.server.broadcast_to_room(room.room_id, {
+                                await self.server.queue_to_room(room.room_id, {
                                     "type": "tile", "x": cx, "y": cy, "val": 0
-                                })
+                                }, near=(cx, cy))
             await self.server.broadcast_to_room(room.room_id, {
                 "type": "chat", "id": self.player_id, "name": "System",
                 "msg": "⚠️ Cave-in! Debris falling nearby!"
@@ -786,17 +2663,231 @@ class DummyClient:
                     if tile in (1, 3, 4, 5):  # Stone types
                         ore = random.choice(vault_ores)
                         wm.update_tile(room.room_id, vx, vy, ore)
-                        need_save = True
-                        await self.server.broadcast_to_room(room.room_id, {
+                        await self.server.queue_to_room(room.room_id, {
                             "type": "tile", "x": vx, "y": vy, "val": ore
-                        })
+                        }, near=(vx, vy))
             await self.server.broadcast_to_room(room.room_id, {
                 "type": "chat", "id": self.player_id, "name": "System",
                 "msg": "💰 Treasure Vault discovered nearby!"
             })
-        
-        if need_save:
-            wm.save_world(room.room_id, room.world)
+
+
+# ============================================================================
+# METRICS
+# ============================================================================
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+FANOUT_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64)
+MAX_METRIC_TYPES = 64  # Message types tracked separately; the rest count as "other"
+
+
+class Histogram:
+    """Fixed-bucket histogram; observe() is one bisect and three adds."""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """Counters and histograms for the /metrics endpoint.
+
+    Hot paths only bump a dict entry or a histogram bucket. Everything that
+    is already tracked elsewhere (save_stats, send_stats, room sim_stats,
+    ...) is read when the endpoint is scraped, not duplicated here.
+    """
+
+    def __init__(self):
+        self.handlers = {}  # message type -> Histogram of handler seconds (count = messages in)
+        self.messages_out = {}  # message type -> deliveries (one per recipient)
+        self.fanout = Histogram(FANOUT_BUCKETS)  # Recipients per room broadcast
+        self.loop_lag = Histogram(LATENCY_BUCKETS)
+        self.started = time.time()
+
+    @staticmethod
+    def _type_key(table, msg_type):
+        if msg_type in table:
+            return msg_type
+        return msg_type if len(table) < MAX_METRIC_TYPES else "other"
+
+    def observe_handler(self, msg_type, seconds):
+        if not isinstance(msg_type, str):
+            msg_type = "other"  # Client-supplied; may be any JSON value
+        hist = self.handlers.get(msg_type)
+        if hist is None:
+            hist = self.handlers.setdefault(self._type_key(self.handlers, msg_type), Histogram(LATENCY_BUCKETS))
+        hist.observe(seconds)
+
+    def count_out(self, msg_type, recipients=1):
+        if not isinstance(msg_type, str):
+            msg_type = "other"
+        out = self.messages_out
+        if msg_type not in out:
+            msg_type = self._type_key(out, msg_type)
+        out[msg_type] = out.get(msg_type, 0) + recipients
+
+    def broadcast(self, msg_type, recipients):
+        self.fanout.observe(recipients)
+        self.count_out(msg_type, recipients)
+
+
+def _metric_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_metric(lines, name, kind, help_text, samples):
+    """Append one metric family in the Prometheus text format.
+
+    samples is a list of (labels dict or None, value).
+    """
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} {kind}")
+    for labels, value in samples:
+        if labels:
+            label_text = ",".join(f'{k}="{_metric_label(v)}"' for k, v in labels.items())
+            lines.append(f"{name}{{{label_text}}} {value}")
+        else:
+            lines.append(f"{name} {value}")
+
+
+def format_histogram(lines, name, help_text, histograms):
+    """Append a histogram family; histograms is a list of (labels dict or None, Histogram)."""
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} histogram")
+    for labels, hist in histograms:
+        prefix = ",".join(f'{k}="{_metric_label(v)}"' for k, v in (labels or {}).items())
+        sep = "," if prefix else ""
+        cumulative = 0
+        for bound, count in zip(hist.buckets, hist.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{prefix}{sep}le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{prefix}{sep}le="+Inf"}} {hist.count}')
+        label_text = "{" + prefix + "}" if prefix else ""
+        lines.append(f"{name}_sum{label_text} {hist.sum}")
+        lines.append(f"{name}_count{label_text} {hist.count}")
+
+
+# ============================================================================
+# PROFILING
+# ============================================================================
+
+MAX_PROFILE_SECONDS = 600
+
+
+class _SlowCallbackHandler(logging.Handler):
+    """Collects asyncio's "Executing <callback> took N seconds" warnings."""
+
+    def __init__(self, records, limit=1000):
+        super().__init__(logging.WARNING)
+        self.records = records
+        self.limit = limit
+
+    def emit(self, record):
+        if len(self.records) < self.limit:
+            self.records.append((record.created, record.getMessage()))
+
+
+class ProfileSession:
+    """One on-demand profiling window on the live server.
+
+    Runs cProfile on the event-loop thread, where all game code runs, and
+    times every handle_game_message dispatch by message type. It also puts
+    the loop in asyncio debug mode so callbacks slower than slow_callback
+    seconds are captured. finish() restores the loop and writes a text
+    report plus the raw .prof file (for pstats/snakeviz) to out_dir.
+
+    Only one session can run per process (cProfile and the loop's debug
+    mode are process-wide); ProfileSession.active holds it.
+    """
+
+    active = None
+
+    def __init__(self, loop, seconds, slow_callback, out_dir, requested_by):
+        self.loop = loop
+        self.seconds = seconds
+        self.slow_callback = slow_callback
+        self.out_dir = out_dir
+        self.requested_by = requested_by
+        self.profiler = cProfile.Profile()
+        self.message_times = {}  # message type -> [count, total seconds, max seconds]
+        self.slow_callbacks = []  # (timestamp, message)
+        self._log_handler = _SlowCallbackHandler(self.slow_callbacks)
+        self._saved_loop = None
+        self.stop_task = None  # Ends the session after `seconds`; cancelled by an early stop
+        self.started = None
+
+    def start(self):
+        self.started = time.time()
+        self._saved_loop = (self.loop.get_debug(), self.loop.slow_callback_duration)
+        self.loop.slow_callback_duration = self.slow_callback
+        self.loop.set_debug(True)
+        logging.getLogger("asyncio").addHandler(self._log_handler)
+        ProfileSession.active = self
+        self.profiler.enable()
+
+    def record(self, msg_type, seconds):
+        if not isinstance(msg_type, str):
+            msg_type = "other"
+        times = self.message_times.get(msg_type)
+        if times is None:
+            if len(self.message_times) >= MAX_METRIC_TYPES:
+                msg_type = "other"
+            times = self.message_times.setdefault(msg_type, [0, 0.0, 0.0])
+        times[0] += 1
+        times[1] += seconds
+        if seconds > times[2]:
+            times[2] = seconds
+
+    def finish(self):
+        """Stop profiling and write the report. Returns the report path."""
+        self.profiler.disable()
+        if ProfileSession.active is self:
+            ProfileSession.active = None
+        logging.getLogger("asyncio").removeHandler(self._log_handler)
+        debug, slow_callback = self._saved_loop
+        self.loop.set_debug(debug)
+        self.loop.slow_callback_duration = slow_callback
+        elapsed = time.time() - self.started
+
+        os.makedirs(self.out_dir, exist_ok=True)
+        stamp = datetime.fromtimestamp(self.started, timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        base = os.path.join(self.out_dir, f"profile-{stamp}")
+        # A stopped profile and the next one can start within the same second
+        n = 1
+        while os.path.exists(base + ".prof"):
+            n += 1
+            base = os.path.join(self.out_dir, f"profile-{stamp}-{n}")
+        self.profiler.dump_stats(base + ".prof")
+
+        out = io.StringIO()
+        out.write(f"Profile started {stamp} by {self.requested_by}, {elapsed:.1f}s\n\n")
+        out.write("== Messages (handle_game_message dispatch) ==\n")
+        out.write(f"{'type':<20}{'count':>8}{'total ms':>12}{'avg ms':>10}{'max ms':>10}\n")
+        for msg_type, (count, total, worst) in sorted(self.message_times.items(), key=lambda kv: -kv[1][1]):
+            out.write(f"{msg_type:<20}{count:>8}{total * 1000:>12.1f}{total * 1000 / count:>10.2f}"
+                      f"{worst * 1000:>10.2f}\n")
+        out.write(f"\n== Slow callbacks (> {self.slow_callback * 1000:.0f}ms) ==\n")
+        for created, text in self.slow_callbacks:
+            out.write(f"{datetime.fromtimestamp(created, timezone.utc).strftime('%H:%M:%S.%f')[:-3]} {text}\n")
+        if not self.slow_callbacks:
+            out.write("none\n")
+        stats = pstats.Stats(self.profiler, stream=out)
+        out.write("\n== Functions by cumulative time ==\n")
+        stats.sort_stats("cumulative").print_stats(40)
+        out.write("\n== Functions by own time ==\n")
+        stats.sort_stats("tottime").print_stats(40)
+        with open(base + ".txt", "w") as f:
+            f.write(out.getvalue())
+        return base + ".txt"
 
 
 # ============================================================================
@@ -812,14 +2903,30 @@ class MegaMinerServer:
         self.worlds = WorldManager(
             self.config['paths']['worlds_directory'],
             self.config['game']['map_width'],
-            self.config['game']['map_height']
+            self.config['game']['map_height'],
+            **self._world_options()
         )
         self.rooms = {}  # room_id -> Room
         self.player_rooms = {}  # username -> room_id
+        self.outboxes = {}  # websocket -> SendQueue
+        self.send_stats = {"sent": 0, "bytes": 0, "dropped": 0, "slow_disconnects": 0, "max_depth": 0}
+        self.metrics = Metrics()
+        self.profile_session = None  # Active ProfileSession, see start_profiling()
         self.shutdown_flag = False
         self.dummy_client = DummyClient(self)
         self.world_name = self.config['server'].get('world_name', 'default-world')
 
+    def _world_options(self):
+        perf = self.config.get('performance', {})
+        defaults = DEFAULT_CONFIG['performance']
+        return {
+            "chunk_cache_mb": perf.get('chunk_cache_mb', defaults['chunk_cache_mb']),
+            "save_max_delay": perf.get('save_max_delay', defaults['save_max_delay']),
+            "journal_enabled": perf.get('journal_enabled', defaults['journal_enabled']),
+            "journal_max_bytes": perf.get('journal_max_bytes', defaults['journal_max_bytes']),
+            "journal_max_age": perf.get('journal_max_age', defaults['journal_max_age'])
+        }
+
     async def start(self):
         """Start the WebSocket server."""
         host = self.config['server']['host']
@@ -875,12 +2982,25 @@ class MegaMinerServer:
             except NotImplementedError:
                 # Windows doesn't support add_signal_handler
                 pass
+        # kill -USR1 <pid> profiles the live server for profile_seconds
+        if hasattr(signal, 'SIGUSR1'):
+            try:
+                asyncio.get_event_loop().add_signal_handler(
+                    signal.SIGUSR1, lambda: self.start_profiling(requested_by="SIGUSR1"))
+            except NotImplementedError:
+                pass
 
-        # Start autosave loop
+        # Start autosave and write-behind flush loops
         asyncio.create_task(self._autosave_loop())
-        
-        # Start dummy client update loop
-        asyncio.create_task(self._dummy_client_loop())
+        asyncio.create_task(self._flush_loop())
+        if self.worlds.journal_enabled:
+            asyncio.create_task(self._journal_sync_loop())
+        asyncio.create_task(self._session_flush_loop())
+        asyncio.create_task(self._loop_lag_loop())
+        await self.start_metrics_server()
+
+        # Start outbound tick (coalesced moves and batch frames)
+        asyncio.create_task(self._broadcast_tick_loop())
 
         # Start the WebSocket server
         async with websockets.serve(
@@ -902,67 +3022,493 @@ class MegaMinerServer:
         self.shutdown_flag = True
         print("\nShutting down...")
 
-        # Save all worlds
+        # Stop room simulations so no tiles change during the final save
+        for room in self.rooms.values():
+            room.timers.cancel_all()
+            if room.sim_task is not None:
+                room.sim_task.cancel()
+        await self.stop_profiling()
+
+        # Save all worlds (drains pending write-behind changes)
         print("Saving worlds...")
+        await self.worlds.wait_for_saves()
         self.worlds.save_all()
+        self.worlds.close()
 
         # Save sessions
         print("Saving sessions...")
         self.accounts._save_sessions()
 
         # Notify all players
+        closing = []
         for room in self.rooms.values():
             for username, player in list(room.players.items()):
-                try:
-                    await self.send_to(player.websocket, {
-                        "type": "server_shutdown",
-                        "message": "Server is shutting down"
-                    })
-                    await player.websocket.close()
-                except Exception:
-                    pass
+                await self.send_to(player.websocket, {
+                    "type": "server_shutdown",
+                    "message": "Server is shutting down"
+                })
+                closing.append(self.close_connection(player.websocket))
+        if closing:
+            await asyncio.wait(closing, timeout=2)
+        self.accounts.close()
 
         print("Shutdown complete.")
         sys.exit(0)
 
     async def _autosave_loop(self):
-        """Periodic autosave of worlds."""
+        """Periodic autosave of worlds with unsaved changes."""
         while not self.shutdown_flag:
             await asyncio.sleep(self.config['server']['autosave_interval'])
-            self.worlds.save_all()
-            saved = len(self.worlds.worlds)
+            saved = await self.worlds.flush_dirty_async(force=True)
             if saved > 0:
                 print(f"[Autosave] Saved {saved} world(s)")
+            self.accounts.report_login_latency()
 
-    async def _dummy_client_loop(self):
-        """Periodic update for dummy client game logic."""
+    async def _journal_sync_loop(self):
+        """Bound how much journaled data a power loss or OS crash can lose."""
+        interval = self.config.get('performance', {}).get(
+            'journal_fsync_interval', DEFAULT_CONFIG['performance']['journal_fsync_interval'])
         while not self.shutdown_flag:
-            await asyncio.sleep(0.1)  # 100ms update rate
-            for room_id in list(self.rooms.keys()):
-                await self.dummy_client.update(room_id)
+            await asyncio.sleep(max(0.1, interval))
+            await self.worlds.sync_journals_async()
 
-    async def send_to(self, websocket, data):
-        """Send JSON data to a websocket."""
-        if getattr(websocket, 'open', getattr(websocket, 'state', None) == websockets.protocol.State.OPEN):
+    async def _session_flush_loop(self):
+        """Batched persistence of session changes (logins, expiry, revokes)."""
+        interval = self.config.get('performance', {}).get(
+            'session_flush_interval', DEFAULT_CONFIG['performance']['session_flush_interval'])
+        while not self.shutdown_flag:
+            await asyncio.sleep(max(1, interval))
+            self.accounts._save_sessions()
+
+    async def _loop_lag_loop(self, interval=0.25):
+        """Measure event-loop lag: how late a short sleep wakes up."""
+        loop = asyncio.get_running_loop()
+        while not self.shutdown_flag:
+            start = loop.time()
+            await asyncio.sleep(interval)
+            self.metrics.loop_lag.observe(max(0.0, loop.time() - start - interval))
+
+    async def start_metrics_server(self):
+        """Serve GET /metrics (Prometheus text format) on its own port."""
+        perf = self.config.get('performance', {})
+        defaults = DEFAULT_CONFIG['performance']
+        port = perf.get('metrics_port', defaults['metrics_port'])
+        if not port:
+            return None
+        host = perf.get('metrics_host', defaults['metrics_host'])
+        try:
+            server = await asyncio.start_server(self._handle_metrics_request, host, port)
+        except OSError as e:
+            print(f"[Metrics] Could not listen on {host}:{port}: {e}")
+            return None
+        print(f"[Metrics] Serving http://{host}:{port}/metrics")
+        return server
+
+    async def _handle_metrics_request(self, reader, writer):
+        try:
+            request = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout=5)
+            parts = request.split(b" ", 2)
+            if len(parts) >= 2 and parts[0] == b"GET" and parts[1].split(b"?")[0] == b"/metrics":
+                status, body = "200 OK", self.render_metrics().encode('utf-8')
+                content_type = "text/plain; version=0.0.4; charset=utf-8"
+            else:
+                status, body, content_type = "404 Not Found", b"Not found\n", "text/plain"
+            writer.write(f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                         f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode('ascii') + body)
+            await writer.drain()
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def render_metrics(self):
+        """Collect all server metrics in the Prometheus text exposition format."""
+        m = self.metrics
+        worlds = self.worlds
+        lines = []
+        format_metric(lines, "megaminer_uptime_seconds", "gauge", "Seconds since the server started.",
+                      [(None, round(time.time() - m.started, 3))])
+        format_metric(lines, "megaminer_connections", "gauge", "Open WebSocket connections.",
+                      [(None, len(self.outboxes))])
+        format_metric(lines, "megaminer_room_players", "gauge", "Connected players per room.",
+                      [({"room": rid}, room.player_count) for rid, room in self.rooms.items()])
+
+        # Message traffic
+        format_metric(lines, "megaminer_messages_in_total", "counter", "Messages received, by type.",
+                      [({"type": t}, h.count) for t, h in m.handlers.items()])
+        format_histogram(lines, "megaminer_handler_seconds", "Time spent handling a received message, by type.",
+                         [({"type": t}, h) for t, h in m.handlers.items()])
+        format_metric(lines, "megaminer_messages_out_total", "counter",
+                      "Messages sent, by type (one per recipient).",
+                      [({"type": t}, n) for t, n in m.messages_out.items()])
+        format_histogram(lines, "megaminer_broadcast_fanout", "Recipients per room broadcast.",
+                         [(None, m.fanout)])
+        send = self.send_stats
+        format_metric(lines, "megaminer_frames_sent_total", "counter", "WebSocket frames written.",
+                      [(None, send.get("sent", 0))])
+        format_metric(lines, "megaminer_bytes_sent_total", "counter", "Payload bytes written (UTF-8 for text frames).",
+                      [(None, send.get("bytes", 0))])
+        format_metric(lines, "megaminer_frames_dropped_total", "counter", "Move frames dropped for slow clients.",
+                      [(None, send.get("dropped", 0))])
+        format_metric(lines, "megaminer_slow_disconnects_total", "counter", "Clients disconnected for being too slow.",
+                      [(None, send.get("slow_disconnects", 0))])
+        format_metric(lines, "megaminer_send_queue_depth", "gauge", "Frames queued per connection (current total and max seen).",
+                      [({"stat": "total"}, sum(len(q) for q in self.outboxes.values())),
+                       ({"stat": "max"}, send.get("max_depth", 0))])
+
+        # Event loop
+        format_histogram(lines, "megaminer_event_loop_lag_seconds", "How late a 250ms sleep wakes up.",
+                         [(None, m.loop_lag)])
+
+        # Room simulation and timers
+        sim_rooms = [(rid, room.sim_stats) for rid, room in self.rooms.items()]
+        format_metric(lines, "megaminer_sim_ticks_total", "counter", "Simulation ticks run.",
+                      [({"room": rid}, st["ticks"]) for rid, st in sim_rooms])
+        format_metric(lines, "megaminer_sim_overruns_total", "counter", "Ticks that took longer than the timestep.",
+                      [({"room": rid}, st["overruns"]) for rid, st in sim_rooms])
+        format_metric(lines, "megaminer_sim_skipped_ticks_total", "counter", "Ticks skipped after a stall.",
+                      [({"room": rid}, st["skipped_ticks"]) for rid, st in sim_rooms])
+        format_metric(lines, "megaminer_sim_tick_seconds", "gauge", "Simulation tick duration (last and max).",
+                      [({"room": rid, "stat": stat}, st[stat + "_duration"])
+                       for rid, st in sim_rooms for stat in ("last", "max")])
+        format_metric(lines, "megaminer_sim_phase_seconds_total", "counter", "Time spent per simulation phase.",
+                      [({"room": rid, "phase": phase}, ps["total"])
+                       for rid, st in sim_rooms for phase, ps in st["phases"].items()])
+        format_metric(lines, "megaminer_sim_phase_runs_total", "counter", "Runs per simulation phase.",
+                      [({"room": rid, "phase": phase}, ps["count"])
+                       for rid, st in sim_rooms for phase, ps in st["phases"].items()])
+        format_metric(lines, "megaminer_sim_phase_max_seconds", "gauge", "Longest run per simulation phase.",
+                      [({"room": rid, "phase": phase}, ps["max"])
+                       for rid, st in sim_rooms for phase, ps in st["phases"].items()])
+        format_metric(lines, "megaminer_timers_pending", "gauge", "Timers (explosives) waiting to fire.",
+                      [({"room": rid}, room.timers.pending) for rid, room in self.rooms.items()])
+        format_metric(lines, "megaminer_timers_fired_total", "counter", "Timers fired.",
+                      [({"room": rid}, room.timers.stats["fired"]) for rid, room in self.rooms.items()])
+        format_metric(lines, "megaminer_timers_failed_total", "counter", "Timer callbacks that raised.",
+                      [({"room": rid}, room.timers.stats["failed"]) for rid, room in self.rooms.items()])
+        format_metric(lines, "megaminer_timer_lag_max_seconds", "gauge", "Latest a timer has fired.",
+                      [({"room": rid}, room.timers.stats["max_lag"]) for rid, room in self.rooms.items()])
+
+        # Worlds and persistence
+        format_metric(lines, "megaminer_world_diffs", "gauge", "Tiles that differ from procedural terrain.",
+                      [({"world": name}, len(worlds._overlay(world))) for name, world in worlds.worlds.items()])
+        save = worlds.save_stats
+        lines.append("# HELP megaminer_save_seconds World save duration.")
+        lines.append("# TYPE megaminer_save_seconds summary")
+        lines.append(f"megaminer_save_seconds_sum {save['total_duration']}")
+        lines.append(f"megaminer_save_seconds_count {save['count']}")
+        format_metric(lines, "megaminer_save_max_seconds", "gauge", "Longest world save.",
+                      [(None, save["max_duration"])])
+        format_metric(lines, "megaminer_save_failures_total", "counter", "Failed world saves.",
+                      [(None, save["failures"])])
+        snap = worlds.snapshot_stats
+        format_metric(lines, "megaminer_map_snapshot_total", "counter", "Map snapshot builds and reuses.",
+                      [({"result": "build"}, snap["builds"]), ({"result": "hit"}, snap["hits"])])
+        cache = worlds.chunk_cache.stats()
+        format_metric(lines, "megaminer_chunk_cache_bytes", "gauge", "Memory held by the terrain chunk cache.",
+                      [(None, cache["bytes"])])
+        format_metric(lines, "megaminer_chunk_cache_total", "counter", "Terrain chunk cache lookups.",
+                      [({"result": "hit"}, cache["hits"]), ({"result": "miss"}, cache["misses"])])
+
+        # Accounts
+        auth = self.accounts.auth_stats
+        format_metric(lines, "megaminer_logins_total", "counter", "Login attempts by result.",
+                      [({"result": "ok"}, auth["logins"]), ({"result": "failed"}, auth["failed_logins"]),
+                       ({"result": "busy"}, auth["busy_rejects"])])
+        latency = self.accounts.login_latency()
+        format_metric(lines, "megaminer_login_latency_seconds", "gauge", "Recent login latency percentiles.",
+                      [({"quantile": q}, latency[key] / 1000)
+                       for q, key in (("0.5", "p50"), ("0.99", "p99"), ("1", "max"))])
+        format_metric(lines, "megaminer_sessions", "gauge", "Live session tokens.",
+                      [(None, len(self.accounts.sessions))])
+        lines.append("")
+        return "\n".join(lines)
+
+    def start_profiling(self, seconds=None, requested_by="admin", notify=None):
+        """Profile the live server for a while, then dump the report.
+
+        Returns False if a profile is already running in this process. notify,
+        if given, is a websocket told where the report was written.
+        """
+        if self.profile_session is not None or ProfileSession.active is not None:
+            return False
+        perf = self.config.get('performance', {})
+        defaults = DEFAULT_CONFIG['performance']
+        if seconds is None:
+            seconds = perf.get('profile_seconds', defaults['profile_seconds'])
+        seconds = max(1, min(MAX_PROFILE_SECONDS, seconds))
+        slow_callback = perf.get('slow_callback_ms', defaults['slow_callback_ms']) / 1000
+        out_dir = os.path.join(self.config['paths']['data_directory'], "profiles")
+        loop = asyncio.get_running_loop()
+        session = ProfileSession(loop, seconds, slow_callback, out_dir, requested_by)
+        self.profile_session = session
+        session.start()
+        session.stop_task = asyncio.create_task(self._stop_profiling_after(session, seconds, notify))
+        print(f"[Profile] Profiling for {seconds}s (requested by {requested_by})")
+        return True
+
+    async def _stop_profiling_after(self, session, seconds, notify):
+        await asyncio.sleep(seconds)
+        if self.profile_session is session:
+            await self.stop_profiling(notify)
+
+    async def stop_profiling(self, notify=None):
+        """Stop the running profile and write its report.
+
+        Returns the report path, or None if nothing was running or the
+        report could not be written.
+        """
+        session = self.profile_session
+        if session is None:
+            return None
+        self.profile_session = None
+        if session.stop_task is not None and session.stop_task is not asyncio.current_task():
+            session.stop_task.cancel()
+        try:
+            path = session.finish()
+        except Exception as e:
+            print(f"[Profile] Could not write profile: {e}")
+            return None
+        print(f"[Profile] Wrote {path}")
+        if notify is not None:
+            await self.send_to(notify, {"type": "system_msg", "message": f"Profile written to {path}"})
+        return path
+
+    async def _flush_loop(self):
+        """Write-behind flush: bound how long any change stays unsaved."""
+        interval = max(0.25, self.worlds.save_max_delay / 4)
+        while not self.shutdown_flag:
+            await asyncio.sleep(interval)
+            await self.worlds.flush_dirty_async()
+
+    def _start_room_sim(self, room):
+        if room.sim_task is None or room.sim_task.done():
+            room.sim_task = asyncio.create_task(self._room_sim_loop(room))
+
+    async def _room_sim_loop(self, room):
+        """Fixed-timestep simulation for one room.
+
+        Ticks are scheduled against the loop clock rather than slept between,
+        so they do not drift and one slow room does not delay the others.
+        After a stall up to max_catchup_ticks are run back to back and any
+        further missed ticks are skipped. Tick durations, overruns (ticks
+        longer than the timestep) and lateness are kept in room.sim_stats.
+        """
+        perf = self.config.get('performance', {})
+        defaults = DEFAULT_CONFIG['performance']
+        dt = 1.0 / max(1, perf.get('sim_tick_hz', defaults['sim_tick_hz']))
+        max_catchup = max(1, perf.get('max_catchup_ticks', defaults['max_catchup_ticks']))
+        stats = room.sim_stats
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time() + dt
+        while not self.shutdown_flag and self.rooms.get(room.room_id) is room:
+            await asyncio.sleep(max(0.0, next_tick - loop.time()))
+            lateness = loop.time() - next_tick
+            if lateness > stats["max_lateness"]:
+                stats["max_lateness"] = lateness
+            behind = int(lateness // dt)
+            if behind >= max_catchup:
+                # Too far behind - drop the oldest ticks instead of bursting
+                skipped = behind - max_catchup + 1
+                stats["skipped_ticks"] += skipped
+                next_tick += skipped * dt
+            if lateness >= dt:
+                stats["late_ticks"] += 1
+
+            start = time.perf_counter()
             try:
-                await websocket.send(json.dumps(data))
-            except Exception:
-                pass
+                await self.dummy_client.tick(room)
+            except Exception as e:
+                print(f"[Sim] Tick error in room '{room.room_id}': {e}")
+            duration = time.perf_counter() - start
+            stats["ticks"] += 1
+            stats["last_duration"] = duration
+            if duration > stats["max_duration"]:
+                stats["max_duration"] = duration
+            if duration > dt:
+                stats["overruns"] += 1
+                if stats["overruns"] == 1 or stats["overruns"] % 100 == 0:
+                    print(f"[Sim] Room '{room.room_id}' tick took {duration * 1000:.1f}ms "
+                          f"(budget {dt * 1000:.0f}ms, {stats['overruns']} overruns)")
+            next_tick += dt
+
+    async def _broadcast_tick_loop(self):
+        """Flush coalesced moves and batched updates at broadcast_tick_hz."""
+        hz = self.config.get('performance', {}).get('broadcast_tick_hz',
+                                                    DEFAULT_CONFIG['performance']['broadcast_tick_hz'])
+        interval = 1.0 / max(1, hz)
+        while not self.shutdown_flag:
+            await asyncio.sleep(interval)
+            for room in list(self.rooms.values()):
+                await self.flush_room_updates(room)
+
+    def _open_outbox(self, websocket):
+        perf = self.config.get('performance', {})
+        defaults = DEFAULT_CONFIG['performance']
+        outbox = SendQueue(websocket,
+                           limit=perf.get('send_queue_limit', defaults['send_queue_limit']),
+                           slow_timeout=perf.get('slow_client_timeout', defaults['slow_client_timeout']),
+                           stats=self.send_stats)
+        self.outboxes[websocket] = outbox
+        return outbox
+
+    def close_connection(self, websocket, code=1000, reason=""):
+        """Close a connection once the frames queued for it have been sent.
+
+        Returns an awaitable that completes when the socket is closed.
+        """
+        outbox = self.outboxes.get(websocket)
+        if outbox is None:
+            return asyncio.ensure_future(websocket.close(code, reason))
+        return outbox.close(code, reason)
+
+    async def send_to(self, websocket, data):
+        """Queue JSON data for a websocket."""
+        self.metrics.count_out(data.get("type"))
+        await self._send_frame([websocket], json.dumps(data))
 
-    async def broadcast_to_room(self, room_id, data, exclude=None):
-        """Send data to all players in a room."""
+    async def broadcast_to_room(self, room_id, data, exclude=None, near=None, reach=0):
+        """Send data to all players in a room.
+
+        The payload is encoded once and the same frame is queued on every
+        recipient's SendQueue; the call never waits for the peers.
+        If near=(x, y) is given, only players whose interest area covers that
+        tile (widened by reach tiles) receive it.
+        """
         room = self.rooms.get(room_id)
         if not room:
             return
         message = json.dumps(data)
-        tasks = []
+        nearby = room.audience(near[0], near[1], reach) if near is not None else None
+        recipients = []
         for username, player in room.players.items():
             if username == exclude:
                 continue
+            if nearby is not None and username not in nearby:
+                continue
             if getattr(player.websocket, 'open', getattr(player.websocket, 'state', None) == websockets.protocol.State.OPEN):
-                tasks.append(self.send_to(player.websocket, data))
-        if tasks:
-            await asyncio.gather(*tasks, return_exceptions=True)
+                recipients.append(player)
+        binary = encode_binary_message(data, room.net_ids) if room.has_binary_clients else None
+        self.metrics.broadcast(data.get("type"), len(recipients))
+        await self._send_encoded(recipients, message, binary)
+
+    async def _send_frame(self, recipients, message, droppable=False):
+        """Queue one encoded frame on several connections.
+
+        Never waits for the peers; each connection's writer task sends it.
+        droppable frames may be discarded if a connection falls behind.
+        """
+        outboxes = self.outboxes
+        for ws in recipients:
+            outbox = outboxes.get(ws)
+            if outbox is not None:
+                outbox.push(message, droppable)
+
+    async def _send_encoded(self, players, text, binary=None, droppable=False):
+        """Send a message to players, as binary to those that negotiated it."""
+        if binary is None:
+            await self._send_frame([p.websocket for p in players], text, droppable)
+            return
+        await self._send_frame([p.websocket for p in players if not p.binary_proto], text, droppable)
+        await self._send_frame([p.websocket for p in players if p.binary_proto], binary, droppable)
+
+    async def _send_batch(self, player, items, droppable=False):
+        """Send one tick's (text, binary) messages to a batch client."""
+        if player.binary_proto:
+            records = [binary for _, binary in items if binary is not None]
+            if records:
+                await self._send_frame([player.websocket], b"".join(records), droppable)
+            texts = [text for text, binary in items if binary is None]
+        else:
+            texts = [text for text, _ in items]
+        if texts:
+            await self._send_frame([player.websocket], '{"type":"batch","msgs":[' + ','.join(texts) + ']}',
+                                   droppable)
+
+    async def send_map_data(self, player, diffs, more=False, world_time=None):
+        """Send a map_data message in the player's negotiated encoding."""
+        self.metrics.count_out("map_data")
+        if player.binary_proto:
+            await self._send_frame([player.websocket], encode_map_binary(diffs, more, world_time))
+            return
+        data = {"type": "map_data", "diffs": diffs, "more": more}
+        if world_time is not None:
+            data["worldTime"] = world_time
+        await self.send_to(player.websocket, data)
+
+    async def queue_to_room(self, room_id, data, exclude=None, near=None, reach=0):
+        """Broadcast data, deferring it to the next tick for batch clients.
+
+        Clients that did not opt into batching get the message immediately.
+        near/reach filter recipients as in broadcast_to_room.
+        """
+        room = self.rooms.get(room_id)
+        if not room:
+            return
+        message = json.dumps(data)
+        binary = encode_binary_message(data, room.net_ids) if room.has_binary_clients else None
+        nearby = room.audience(near[0], near[1], reach) if near is not None else None
+        legacy = []
+        batched = 0
+        for username, player in room.players.items():
+            if username == exclude:
+                continue
+            if nearby is not None and username not in nearby:
+                continue
+            if player.supports_batch:
+                batched += 1
+            elif getattr(player.websocket, 'open', getattr(player.websocket, 'state', None) == websockets.protocol.State.OPEN):
+                legacy.append(player)
+        if batched:
+            room.batch_queue.append((message, binary, exclude, nearby))
+        self.metrics.broadcast(data.get("type"), len(legacy) + batched)
+        await self._send_encoded(legacy, message, binary)
+
+    async def flush_room_updates(self, room):
+        """Send this tick's coalesced moves and queued updates.
+
+        Only the latest move per player is kept, and it only goes to players
+        within interest range of the mover. Batch clients get everything in
+        one {"type": "batch", "msgs": [...]} frame; other clients get one
+        frame per moved player. Each message is encoded once per tick.
+        """
+        moves = room.pending_moves
+        queued = room.batch_queue
+        if not moves and not queued:
+            return
+        room.pending_moves = {}
+        room.batch_queue = []
+        room.last_moves.update(moves)
+        with_binary = room.has_binary_clients
+        encoded_moves = []
+        metrics = self.metrics
+        for mover, packet in moves.items():
+            pos = room.interest.positions.get(mover)
+            audience = room.interest.query(*pos) if pos is not None else None
+            metrics.broadcast("move", max(0, (len(audience) if audience is not None else len(room.players)) - 1))
+            binary = encode_binary_message(packet, room.net_ids) if with_binary else None
+            encoded_moves.append((mover, json.dumps(packet), binary, audience))
+
+        legacy = {}
+        for username, player in room.players.items():
+            if not getattr(player.websocket, 'open', getattr(player.websocket, 'state', None) == websockets.protocol.State.OPEN):
+                continue
+            if player.supports_batch:
+                items = [(text, binary) for text, binary, excluded, audience in queued
+                         if excluded != username and (audience is None or username in audience)]
+                # A tick of nothing but moves is superseded by the next one
+                moves_only = not items
+                items.extend((text, binary) for mover, text, binary, audience in encoded_moves
+                             if mover != username and (audience is None or username in audience))
+                if items:
+                    await self._send_batch(player, items, droppable=moves_only)
+            else:
+                legacy[username] = player
+
+        for mover, text, binary, audience in encoded_moves:
+            await self._send_encoded([p for username, p in legacy.items()
+                                      if username != mover and (audience is None or username in audience)],
+                                     text, binary, droppable=True)
 
     # ========================================================================
     # CONNECTION HANDLER
@@ -977,9 +3523,19 @@ class MegaMinerServer:
         player = None
         room_id = None
         username = None
+        outbox = self._open_outbox(websocket)
+        metrics = self.metrics
 
         try:
             async for raw_message in websocket:
+                start = time.perf_counter()
+                if isinstance(raw_message, bytes) and player is not None and player.binary_proto:
+                    for message in decode_binary_messages(raw_message):
+                        await self.handle_game_message(player, room_id, message)
+                        now = time.perf_counter()
+                        metrics.observe_handler(message["type"], now - start)
+                        start = now
+                    continue
                 try:
                     message = json.loads(raw_message)
                 except json.JSONDecodeError:
@@ -989,11 +3545,11 @@ class MegaMinerServer:
                 msg_type = message.get("type")
 
                 if msg_type == "register":
-                    response = self.handle_register(message)
+                    response = await self.handle_register(message)
                     await self.send_to(websocket, response)
 
                 elif msg_type == "login":
-                    response = self.handle_login(message)
+                    response = await self.handle_login(message)
                     await self.send_to(websocket, response)
                     if response.get("success"):
                         # Player is now authenticated, wait for join
@@ -1025,6 +3581,8 @@ class MegaMinerServer:
                         "message": "Not authenticated. Please login or register first."
                     })
 
+                metrics.observe_handler(msg_type, time.perf_counter() - start)
+
         except websockets.exceptions.ConnectionClosed:
             pass
         except Exception as e:
@@ -1033,26 +3591,31 @@ class MegaMinerServer:
             # Cleanup on disconnect
             if username and room_id:
                 await self.handle_disconnect(username, room_id)
+            # Deliver anything still queued (e.g. a join error) before closing
+            await asyncio.wait([outbox.close()], timeout=2)
+            outbox.stop()
+            if self.outboxes.get(websocket) is outbox:
+                del self.outboxes[websocket]
 
     # ========================================================================
     # ACCOUNT HANDLING
     # ========================================================================
 
-    def handle_register(self, message):
+    async def handle_register(self, message):
         username = message.get("username", "").strip()
         password = message.get("password", "")
 
         if not self.config['accounts']['allow_registration']:
             return {"type": "register_result", "success": False, "message": "Registration is disabled"}
 
-        success, msg = self.accounts.register(username, password)
+        success, msg = await self.accounts.register_async(username, password)
         return {"type": "register_result", "success": success, "message": msg}
 
-    def handle_login(self, message):
+    async def handle_login(self, message):
         username = message.get("username", "").strip()
         password = message.get("password", "")
 
-        success, msg, token = self.accounts.login(username, password)
+        success, msg, token = await self.accounts.login_async(username, password)
         return {
             "type": "login_result",
             "success": success,
@@ -1117,16 +3680,14 @@ class MegaMinerServer:
             if old_room and username in old_room.players:
                 # Replace old connection
                 old_player = old_room.players[username]
-                try:
-                    await old_player.websocket.close()
-                except Exception:
-                    pass
-                del old_room.players[username]
+                self.close_connection(old_player.websocket)
+                old_room.remove_player(username)
                 print(f"[Reconnect] {username} reconnecting")
 
         # Get or create room (always uses world_name)
         if room_id not in self.rooms:
             self.rooms[room_id] = Room(room_id, self.worlds, self.config)
+            self._start_room_sim(self.rooms[room_id])
             print(f"[Room] Created room '{room_id}'")
 
         room = self.rooms[room_id]
@@ -1151,7 +3712,12 @@ class MegaMinerServer:
 
         # Create player state
         player = PlayerState(websocket, username, token)
+        player.outbox = self.outboxes.get(websocket)
         player.color = color
+        player.supports_batch = bool(message.get("batch", False))
+        player.binary_proto = message.get("proto") == BINARY_PROTOCOL
+        player.chunk_sync = bool(message.get("chunkSync", False))
+        player.streaming = bool(message.get("stream", False))
 
         # Restore persistent player data if available
         if username in room.world.get("player_data", {}):
@@ -1183,9 +3749,11 @@ class MegaMinerServer:
         if room.admin is None:
             room.admin = username
             player.player_id = username  # Admin gets a stable ID
+        room.assign_net_id(player)
 
         # Add to room
         room.players[username] = player
+        room.interest.update(username, player.grid_x, player.grid_y)
         self.player_rooms[username] = room_id
         room.last_activity = time.time()
 
@@ -1203,16 +3771,27 @@ class MegaMinerServer:
             "isAdmin": username == room.admin,
             "players": [p.to_dict() for p in room.players.values()],
             "bannedIds": world.get("banned_ids", []),
-            "proceduralSeed": world.get("procedural_seed", 0)
+            "proceduralSeed": world.get("procedural_seed", 0),
+            "batch": player.supports_batch,
+            "proto": BINARY_PROTOCOL if player.binary_proto else "json",
+            "netId": player.net_id,
+            "stream": player.streaming
         })
 
-        # Send map diffs to joining player (client generates base terrain from seed)
-        await self.send_map_diffs(websocket, room_id)
+        # Send map diffs to joining player (client generates base terrain from seed).
+        # A reconnecting client that still has the map asks for a resync instead
+        # and follows up with a sync_manifest of the chunks it has cached.
+        # Streaming clients subscribe to the chunks around them instead.
+        if player.streaming:
+            await self.send_map_data(player, [], more=False, world_time=int(time.time() * 1000))
+        elif not message.get("resync"):
+            await self.send_map_diffs(player, room_id)
 
         # Notify other players
         await self.broadcast_to_room(room_id, {
             "type": "join",
             "id": player.player_id,
+            "netId": player.net_id,
             "username": username,
             "color": player.color,
             "joinedAt": int(player.joined_at * 1000)
@@ -1220,50 +3799,29 @@ class MegaMinerServer:
 
         return player, room_id, username
 
-    async def send_map_diffs(self, websocket, room_id):
+    async def send_map_diffs(self, player, room_id):
         """Send only the diffs (changes from procedural) to a joining client.
         
         The client generates the base terrain from the procedural seed, then
         applies these diffs on top. This is MUCH faster than sending the full map.
+        The diff frames come from a shared snapshot, encoded once per world
+        version rather than once per player.
         """
-        room = self.rooms.get(room_id)
-        if not room:
-            return
-        world = room.world
-        diffs = world.get('diffs', [])
-        
-        # Send diffs in chunks to avoid overwhelming the connection
-        chunk_size = 10000
-        total_diffs = len(diffs)
-        
-        if total_diffs == 0:
-            # No diffs - just send empty map_data to signal ready
-            await self.send_to(websocket, {
-                "type": "map_data",
-                "diffs": [],
-                "more": False,
-                "worldTime": int(time.time() * 1000)
-            })
-            return
+        frames, patch = self.worlds.map_snapshot(room_id, player.binary_proto)
+        self.metrics.count_out("map_data", len(frames))
+        for frame in frames:
+            await self._send_frame([player.websocket], frame)
         
-        for i in range(0, total_diffs, chunk_size):
-            chunk = diffs[i:i + chunk_size]
-            await self.send_to(websocket, {
-                "type": "map_data",
-                "diffs": chunk,
-                "more": i + chunk_size < total_diffs
+        # Final frame carries tiles changed since the snapshot, plus worldTime
+        await self.send_map_data(player, patch, more=False, world_time=int(time.time() * 1000))
+        if player.chunk_sync:
+            # Baseline for a later sync_manifest after a reconnect
+            await self.send_to(player.websocket, {
+                "type": "sync_manifest",
+                "chunks": self.worlds.get_chunk_manifest(room_id)
             })
-            await asyncio.sleep(0.005)  # Small delay to prevent flooding
-        
-        # Send final chunk with worldTime
-        await self.send_to(websocket, {
-            "type": "map_data",
-            "diffs": [],
-            "more": False,
-            "worldTime": int(time.time() * 1000)
-        })
         
-        print(f"[Map] Sent {total_diffs} diffs to joining player")
+        print(f"[Map] Sent {len(frames)} snapshot frames + {len(patch)} patched diffs to {player.username}")
 
     # ========================================================================
     # GAME MESSAGE HANDLING
@@ -1271,6 +3829,17 @@ class MegaMinerServer:
 
     async def handle_game_message(self, player, room_id, message):
         """Handle game-related messages from an authenticated player."""
+        session = self.profile_session
+        if session is None:
+            await self._dispatch_game_message(player, room_id, message)
+            return
+        start = time.perf_counter()
+        try:
+            await self._dispatch_game_message(player, room_id, message)
+        finally:
+            session.record(message.get("type"), time.perf_counter() - start)
+
+    async def _dispatch_game_message(self, player, room_id, message):
         msg_type = message.get("type")
 
         if msg_type == "move":
@@ -1310,6 +3879,12 @@ class MegaMinerServer:
         elif msg_type == "view_req":
             await self.handle_view_req(player, room_id, message)
 
+        elif msg_type == "sync_manifest":
+            await self.handle_sync_manifest(player, room_id, message)
+
+        elif msg_type == "subscribe":
+            await self.handle_subscribe(player, room_id, message)
+
         elif msg_type == "admin_action":
             await self.handle_admin_action(player, room_id, message)
 
@@ -1339,12 +3914,12 @@ class MegaMinerServer:
 
         elif msg_type == "place_explosive":
             # Player placed TNT or Nuke - register with dummy client
-            x = message.get("x")
-            y = message.get("y")
-            range_val = message.get("range", 3)
+            pos = self._tile_coords(message.get("x"), message.get("y"))
+            range_val = self._explosion_radius(message.get("range", 3))
             timer = message.get("timer", 2000)
-            if x is not None and y is not None:
-                self.dummy_client.add_explosive(x, y, range_val, timer)
+            if pos is not None and range_val is not None and self._valid_timer(timer):
+                x, y = pos
+                await self.dummy_client.add_explosive(room_id, x, y, range_val, timer)
                 # Broadcast the explosion placement to other players
                 await self.broadcast_to_room(room_id, {
                     "type": "explode",
@@ -1353,7 +3928,7 @@ class MegaMinerServer:
                     "y": y,
                     "r": range_val,
                     "t": timer
-                }, exclude=player.username)
+                }, exclude=player.username, near=(x, y), reach=range_val)
 
         else:
             # Unknown message types - just log
@@ -1368,16 +3943,29 @@ class MegaMinerServer:
         player.last_heartbeat = time.time()
         player.x = message.get("sx", player.x)
         player.y = message.get("sy", player.y)
-        player.grid_x = message.get("gx", player.grid_x)
-        player.grid_y = message.get("gy", player.grid_y)
+        gx = message.get("gx", player.grid_x)
+        gy = message.get("gy", player.grid_y)
+        # Grid positions feed the interest grid and the room sim, so only
+        # in-map values are kept (this also drops NaN and Infinity)
+        if self._tile_coords(gx, gy) is not None:
+            player.grid_x, player.grid_y = gx, gy
         player.rotation = message.get("r", player.rotation)
         player.is_drilling = message.get("drill", player.is_drilling)
         player.color = message.get("col", player.color)
 
         room = self.rooms.get(room_id)
-        is_admin = room and player.username == room.admin
+        if not room:
+            return
+        is_admin = player.username == room.admin
 
-        await self.broadcast_to_room(room_id, {
+        if self._tile_coords(player.grid_x, player.grid_y) is not None:
+            old_pos = room.interest.positions.get(player.username)
+            before = room.interest.query(*old_pos) if old_pos is not None else set()
+            if room.interest.update(player.username, player.grid_x, player.grid_y):
+                await self._enter_interest_cell(player, room, before)
+
+        # Coalesced: only the latest move per player is sent on the next tick
+        room.pending_moves[player.username] = {
             "type": "move",
             "id": player.player_id,
             "sx": player.x,
@@ -1392,7 +3980,27 @@ class MegaMinerServer:
             "username": player.username,
             "joinedAt": int(player.joined_at * 1000),
             "isAdmin": is_admin
-        }, exclude=player.username)
+        }
+
+    async def _enter_interest_cell(self, player, room, before):
+        """Catch a player up after they cross into a new interest cell.
+
+        Updates are only routed to nearby players, so send the latest position
+        of players that just came into range and the current diffs around the
+        player's new position.
+        """
+        now_visible = room.interest.query(player.grid_x, player.grid_y)
+        for username in now_visible - before - {player.username}:
+            packet = room.last_moves.get(username)
+            if packet is not None:
+                await self.send_to(player.websocket, packet)
+        if player.streaming:
+            return  # Map data follows chunk subscriptions instead
+        radius = room.interest.radius
+        diffs = self.worlds.get_area_diff(room.room_id, player.grid_x - radius, player.grid_y - radius,
+                                          2 * radius + 1, 2 * radius + 1)
+        if diffs:
+            await self.send_map_data(player, diffs)
 
     async def handle_chat(self, player, room_id, message):
         """Handle chat messages."""
@@ -1410,43 +4018,69 @@ class MegaMinerServer:
         y = message.get("y")
         val = message.get("val")
         if x is not None and y is not None and val is not None:
+            # Marks the chunk dirty - saved within save_max_delay by the flush loop.
+            # Rejected updates (malformed or off-map) are not relayed.
+            if not self.worlds.update_tile(room_id, x, y, val):
+                return
             print(f"[Tile] {player.username} updated tile at ({x},{y}) = {val}")
-            self.worlds.update_tile(room_id, x, y, val)
-            world = self.rooms.get(room_id).world if self.rooms.get(room_id) else None
-            if world:
-                diffs_count = len(world.get('diffs', []))
-                print(f"[Tile] World now has {diffs_count} diffs")
-                # Save world immediately on tile update to prevent data loss
-                self.worlds.save_world(room_id, world)
-                print(f"[Tile] World saved to disk ({diffs_count} diffs)")
-            await self.broadcast_to_room(room_id, {
+            await self.queue_to_room(room_id, {
                 "type": "tile",
                 "x": x,
                 "y": y,
                 "val": val
-            }, exclude=player.username)
+            }, exclude=player.username, near=(x, y))
+
+    def _tile_coords(self, x, y):
+        """Client-supplied tile coordinates as in-map ints, or None if malformed."""
+        for v in (x, y):
+            if isinstance(v, bool) or not isinstance(v, (int, float)):
+                return None
+        if not (0 <= x < self.worlds.mw and 0 <= y < self.worlds.mh):
+            return None  # Also rejects NaN/inf
+        return int(x), int(y)
+
+    @staticmethod
+    def _valid_timer(value):
+        """Fuse times (ms) must be numbers within a minute."""
+        return not isinstance(value, bool) and isinstance(value, (int, float)) and 0 <= value <= 60000
+
+    @staticmethod
+    def _explosion_radius(value):
+        """A client-supplied blast radius as an int capped at MAX_EXPLOSION_RADIUS, or None."""
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or value != value:
+            return None
+        return int(max(0, min(value, MAX_EXPLOSION_RADIUS)))
 
     async def handle_aoe_mine(self, player, room_id, message):
-        """Handle AOE mining updates."""
-        # AOE mining also changes tiles - save the world
-        room = self.rooms.get(room_id)
-        await self.broadcast_to_room(room_id, {
+        """Relay an AOE mine to nearby players as an effect.
+
+        The miner stops at its cargo limit, so the world is only changed by
+        the tile_update it sends for each tile it actually mined.
+        """
+        pos = self._tile_coords(message.get("x"), message.get("y"))
+        r = message.get("r", 0)
+        tier = message.get("t", 0)
+        if pos is None or not all(isinstance(v, int) for v in (r, tier)):
+            return
+        x, y = pos
+        r = max(0, min(r, MAX_AOE_RADIUS))
+        await self.queue_to_room(room_id, {
             "type": "aoe_mine",
             "id": player.player_id,
-            "x": message.get("x"),
-            "y": message.get("y"),
-            "r": message.get("r", 0),
-            "t": message.get("t", 0)
-        }, exclude=player.username)
+            "x": x,
+            "y": y,
+            "r": r,
+            "t": max(0, min(tier, MAX_DRILL_TIER))
+        }, exclude=player.username, near=(x, y), reach=r)
 
     async def handle_explode(self, player, room_id, message):
         """Handle explosion events - register with dummy client."""
-        x = message.get("x")
-        y = message.get("y")
-        r = message.get("r", 3)
+        pos = self._tile_coords(message.get("x"), message.get("y"))
+        r = self._explosion_radius(message.get("r", 3))
         t = message.get("t", 2000)
-        if x is not None and y is not None:
-            self.dummy_client.add_explosive(x, y, r, t)
+        if pos is not None and r is not None and self._valid_timer(t):
+            x, y = pos
+            await self.dummy_client.add_explosive(room_id, x, y, r, t)
             await self.broadcast_to_room(room_id, {
                 "type": "explode",
                 "id": player.player_id,
@@ -1454,7 +4088,7 @@ class MegaMinerServer:
                 "y": y,
                 "r": r,
                 "t": t
-            }, exclude=player.username)
+            }, exclude=player.username, near=(x, y), reach=r)
 
     async def handle_fuel_transfer(self, player, room_id, message):
         """Handle fuel transfers between players."""
@@ -1494,18 +4128,103 @@ class MegaMinerServer:
 
         requester_name = message.get("from")
         if requester_name and requester_name in room.players:
-            requester = room.players[requester_name]
-            # Send all diffs
-            diffs = self.worlds.get_all_diffs(room_id)
-            chunk_size = 10000
-            for i in range(0, len(diffs), chunk_size):
-                chunk = diffs[i:i + chunk_size]
-                await self.send_to(requester.websocket, {
-                    "type": "map_data",
-                    "diffs": chunk,
-                    "more": i + chunk_size < len(diffs)
-                })
-                await asyncio.sleep(0.01)
+            # Send all diffs from the shared snapshot
+            await self.send_map_diffs(room.players[requester_name], room_id)
+
+    async def handle_sync_manifest(self, player, room_id, message):
+        """Send only the chunks that changed since a client's cached manifest.
+
+        The client reports { "cx,cy": hash } for the chunks it holds diffs
+        for; each chunk whose hash differs is sent whole in sync_chunks
+        frames, and the client resets it to procedural before applying them.
+
+        A streaming client is only resynced for the chunks it is subscribed
+        to. The hashes of the rest are kept as its known copies, so a later
+        subscribe sends only the chunks that changed.
+        """
+        chunks = message.get("chunks")
+        if not isinstance(chunks, dict):
+            return
+        max_chunks = (self.worlds.mw // CHUNK_SIZE + 1) * (self.worlds.mh // CHUNK_SIZE + 1)
+        client_manifest = {}
+        for key, content_hash in list(chunks.items())[:max_chunks]:
+            try:
+                cx, cy = (int(v) for v in str(key).split(","))
+            except ValueError:
+                continue
+            client_manifest[(cx, cy)] = str(content_hash)
+
+        if player.streaming:
+            for chunk, content_hash in client_manifest.items():
+                if chunk not in player.subscriptions:
+                    player.known_hashes[chunk] = content_hash
+            changed = self.worlds.get_changed_chunks(
+                room_id, client_manifest, chunks=player.subscriptions & client_manifest.keys())
+        else:
+            changed = self.worlds.get_changed_chunks(room_id, client_manifest)
+        frame, frame_diffs, total_diffs = [], 0, 0
+        for entry in changed:
+            frame.append(entry)
+            frame_diffs += len(entry[3])
+            if frame_diffs >= MapSnapshot.JSON_CHUNK:
+                await self.send_to(player.websocket, {"type": "sync_chunks", "chunks": frame, "more": True})
+                total_diffs += frame_diffs
+                frame, frame_diffs = [], 0
+        total_diffs += frame_diffs
+        await self.send_to(player.websocket, {
+            "type": "sync_chunks",
+            "chunks": frame,
+            "more": False,
+            "worldTime": int(time.time() * 1000)
+        })
+        print(f"[Map] Resync for {player.username}: {len(changed)} of "
+              f"{len(client_manifest)} cached chunks changed, {total_diffs} diffs sent")
+
+    async def handle_subscribe(self, player, room_id, message):
+        """Subscribe a streaming client to the chunks around a center chunk.
+
+        Newly subscribed chunks are streamed nearest first in sync_chunks
+        frames, skipping any the client already holds an up-to-date copy of.
+        After that the client only gets tile changes inside its chunks.
+        """
+        room = self.rooms.get(room_id)
+        if not room or not player.streaming:
+            return
+        cx, cy, r = message.get("cx"), message.get("cy"), message.get("r", 2)
+        if not all(isinstance(v, int) for v in (cx, cy, r)):
+            return
+        max_radius = self.config.get('performance', {}).get(
+            'max_subscribe_radius', DEFAULT_CONFIG['performance']['max_subscribe_radius'])
+        r = max(0, min(r, max_radius))
+        max_cx = (self.worlds.mw - 1) // CHUNK_SIZE
+        max_cy = (self.worlds.mh - 1) // CHUNK_SIZE
+        wanted = {(x, y)
+                  for y in range(max(0, cy - r), min(max_cy, cy + r) + 1)
+                  for x in range(max(0, cx - r), min(max_cx, cx + r) + 1)}
+        added, dropped = room.set_subscriptions(player, wanted)
+        # Tile changes in dropped chunks stop arriving, so remember what the
+        # client's copy looks like now
+        for chunk in dropped:
+            player.known_hashes[chunk] = self.worlds.get_chunk_diffs(room_id, *chunk)[0]
+        added.sort(key=lambda c: (c[0] - cx) ** 2 + (c[1] - cy) ** 2)
+
+        frame, frame_diffs, sent, streamed = [], 0, 0, False
+        for chunk in added:
+            content_hash, diffs = self.worlds.get_chunk_diffs(room_id, *chunk)
+            # Chunks never sent are pristine procedural terrain on the client
+            if player.known_hashes.pop(chunk, "") == content_hash:
+                continue
+            frame.append([chunk[0], chunk[1], content_hash, diffs])
+            frame_diffs += len(diffs)
+            sent += 1
+            if frame_diffs >= 2000:
+                await self.send_to(player.websocket, {"type": "sync_chunks", "chunks": frame, "more": True})
+                frame, frame_diffs, streamed = [], 0, True
+                await asyncio.sleep(0)  # Let other players' messages through
+        if frame or streamed:
+            await self.send_to(player.websocket, {"type": "sync_chunks", "chunks": frame, "more": False})
+        if sent:
+            print(f"[Map] Streamed {sent} of {len(added)} new chunks to {player.username}")
 
     async def handle_view_req(self, player, room_id, message):
         """Handle viewport sync requests."""
@@ -1523,19 +4242,20 @@ class MegaMinerServer:
             requester = room.players[requester_name]
             diffs = self.worlds.get_area_diff(room_id, bx, by, bw, bh)
             if diffs:
-                await self.send_to(requester.websocket, {
-                    "type": "map_data",
-                    "diffs": diffs,
-                    "more": False
-                })
+                await self.send_map_data(requester, diffs)
 
     async def handle_admin_action(self, player, room_id, message):
         """Handle admin actions: kick, ban, etc."""
+        action = message.get("action")
+        if action == "profile":
+            # Server-wide: allowed for configured server admins, not room admins
+            await self.handle_profile_request(player, message)
+            return
+
         room = self.rooms.get(room_id)
         if not room or player.username != room.admin:
             return
 
-        action = message.get("action")
         target_username = message.get("target")
 
         if action == "kick":
@@ -1545,8 +4265,8 @@ class MegaMinerServer:
                     "type": "kick",
                     "target": target.player_id
                 })
-                await target.websocket.close()
-                del room.players[target_username]
+                self.close_connection(target.websocket)
+                room.remove_player(target_username)
                 self.player_rooms.pop(target_username, None)
                 await self.broadcast_to_room(room_id, {
                     "type": "system_msg",
@@ -1561,12 +4281,13 @@ class MegaMinerServer:
                     if "banned_ids" not in world:
                         world["banned_ids"] = []
                     world["banned_ids"].append(target.player_id)
+                    self.worlds.mark_dirty(room_id)
                 await self.send_to(target.websocket, {
                     "type": "kick",
                     "target": target.player_id
                 })
-                await target.websocket.close()
-                del room.players[target_username]
+                self.close_connection(target.websocket)
+                room.remove_player(target_username)
                 self.player_rooms.pop(target_username, None)
 
         elif action == "transfer_admin":
@@ -1577,6 +4298,35 @@ class MegaMinerServer:
                     "target": target_username
                 })
 
+        elif action == "chunk_info":
+            # Debug view of where the room's diffs are and how often they change
+            await self.send_to(player.websocket, {
+                "type": "chunk_info",
+                "chunks": self.worlds.get_chunk_info(room_id)
+            })
+
+    async def handle_profile_request(self, player, message):
+        """Start (or with "stop": true, end early) a profile.
+
+        Only logged-in accounts listed in accounts.server_admins may do this.
+        """
+        admins = self.config['accounts'].get('server_admins', [])
+        if not player.account_token or player.username not in admins:
+            print(f"[Profile] Ignored profile request from non-admin {player.username}")
+            return
+        if message.get("stop"):
+            if await self.stop_profiling(notify=player.websocket) is None:
+                await self.send_to(player.websocket, {"type": "system_msg", "message": "No profile is running"})
+            return
+        seconds = message.get("seconds")
+        if not isinstance(seconds, (int, float)) or isinstance(seconds, bool) or seconds != seconds:
+            seconds = None
+        started = self.start_profiling(seconds, requested_by=player.username, notify=player.websocket)
+        await self.send_to(player.websocket, {
+            "type": "system_msg",
+            "message": "Profiling started" if started else "A profile is already running"
+        })
+
     async def handle_save_player_data(self, player, room_id, message):
         """Save player progression data to the world."""
         room = self.rooms.get(room_id)
@@ -1588,8 +4338,8 @@ class MegaMinerServer:
             room.world["player_data"][player.username] = {}
 
         room.world["player_data"][player.username].update(data)
-        # Also save to disk periodically
-        self.worlds.save_world(room_id)
+        # Saved to disk by the write-behind flush
+        self.worlds.mark_dirty(room_id)
 
     async def handle_promote_host(self, player, room_id, message):
         """Handle admin promotion requests."""
@@ -1636,13 +4386,13 @@ class MegaMinerServer:
                 "blueprints": player.blueprints,
                 "achievements": player.achievements
             })
-            # Save world to disk - use the room's world object directly
-            self.worlds.save_world(room_id, room.world)
-            print(f"[Save] Saved progress for {username}")
+            # Saved to disk by the write-behind flush
+            self.worlds.mark_dirty(room_id)
+            print(f"[Save] Queued progress save for {username}")
 
         # Remove player from room
         if username in room.players:
-            del room.players[username]
+            room.remove_player(username)
             self.player_rooms.pop(username, None)
             print(f"[Disconnect] {username} left world '{room_id}' (Players: {room.player_count})")
 
@@ -1671,8 +4421,9 @@ class MegaMinerServer:
             # Clean up empty rooms
             if room.player_count == 0:
                 print(f"[Room] Room '{room_id}' is now empty, saving...")
-                # Save world one more time before cleanup - pass world object directly
-                self.worlds.save_world(room_id, room.world)
+                # Flush pending changes before cleanup - pass world object directly
+                if self.worlds.is_dirty(room_id):
+                    await self.worlds.save_world_async(room_id, room.world)
                 # Keep room for a while in case someone rejoins
                 asyncio.create_task(self._cleanup_empty_room(room_id))
 
@@ -1681,6 +4432,9 @@ class MegaMinerServer:
         await asyncio.sleep(300)  # 5 minutes
         room = self.rooms.get(room_id)
         if room and room.player_count == 0:
+            room.timers.cancel_all()
+            if room.sim_task is not None:
+                room.sim_task.cancel()
             del self.rooms[room_id]
             print(f"[Room] Room '{room_id}' cleaned up")
 
@@ -1699,8 +4453,22 @@ def main():
                         help="Host to listen on (overrides config)")
     parser.add_argument("-w", "--world", default=None,
                         help="World name (overrides config)")
+    parser.add_argument("--verify-terrain", action="store_true",
+                        help="Check vectorized terrain against golden vectors and exit")
+    parser.add_argument("--convert-world", metavar="JSON_PATH", default=None,
+                        help="Convert a legacy JSON world file to the binary format and exit")
     args = parser.parse_args()
 
+    if args.convert_world:
+        out_path, diffs_count = convert_legacy_world(args.convert_world)
+        print(f"[Convert] Wrote {out_path} ({diffs_count} diffs)")
+        sys.exit(0)
+
+    if args.verify_terrain:
+        ok, msg = verify_procedural_region()
+        print(f"[Terrain] {'OK' if ok else 'FAILED'}: {msg}")
+        sys.exit(0 if ok else 1)
+
     server = MegaMinerServer(args.config)
 
     # Override from command line